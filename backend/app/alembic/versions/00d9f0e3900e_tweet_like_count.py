@@ -0,0 +1,46 @@
+"""tweet like count
+
+Revision ID: 00d9f0e3900e
+Revises: ada34e664b7f
+Create Date: 2026-10-18 12:41:05.873920
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "00d9f0e3900e"
+down_revision = "ada34e664b7f"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "table_tweets",
+        sa.Column("like_count", sa.Integer(), server_default="0", nullable=False),
+    )
+    op.execute(
+        """
+        UPDATE table_tweets
+        SET like_count = counts.like_count
+        FROM (
+            SELECT tweet_id, count(*) AS like_count
+            FROM table_likes
+            GROUP BY tweet_id
+        ) AS counts
+        WHERE table_tweets.tweet_id = counts.tweet_id
+        """
+    )
+    op.create_index(
+        "ix_table_tweets_like_count_tweet_id",
+        "table_tweets",
+        [sa.text("like_count DESC"), sa.text("tweet_id DESC")],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_table_tweets_like_count_tweet_id", table_name="table_tweets")
+    op.drop_column("table_tweets", "like_count")
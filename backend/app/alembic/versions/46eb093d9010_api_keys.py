@@ -0,0 +1,56 @@
+"""api keys
+
+Revision ID: 46eb093d9010
+Revises: dfbc28761446
+Create Date: 2026-10-18 20:05:31.774920
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "46eb093d9010"
+down_revision = "dfbc28761446"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "table_api_keys",
+        sa.Column(
+            "api_key_id",
+            sa.Integer(),
+            sa.Identity(always=True),
+            nullable=False,
+        ),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(), nullable=True),
+        sa.Column("hash_prefix", sa.String(length=16), nullable=False),
+        sa.Column("key_hash", sa.String(length=64), nullable=False),
+        sa.Column(
+            "created_at", sa.DateTime(), server_default=sa.func.now(), nullable=False
+        ),
+        sa.Column("last_used_at", sa.DateTime(), nullable=True),
+        sa.Column("revoked_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["user_id"], ["table_users.user_id"], ondelete="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("api_key_id"),
+    )
+    op.create_index(
+        "ix_table_api_keys_hash_prefix",
+        "table_api_keys",
+        ["hash_prefix"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_table_api_keys_user_id", "table_api_keys", ["user_id"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_table_api_keys_user_id", table_name="table_api_keys")
+    op.drop_index("ix_table_api_keys_hash_prefix", table_name="table_api_keys")
+    op.drop_table("table_api_keys")
@@ -0,0 +1,46 @@
+"""media owner
+
+Revision ID: 4ddd9f759e8a
+Revises: 80a83368ca23
+Create Date: 2026-10-18 18:21:37.904416
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "4ddd9f759e8a"
+down_revision = "80a83368ca23"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("table_media", sa.Column("owner_id", sa.Integer(), nullable=True))
+    op.create_foreign_key(
+        "table_media_owner_id_fkey",
+        "table_media",
+        "table_users",
+        ["owner_id"],
+        ["user_id"],
+    )
+    # media uploaded before content addressed storage is stored under
+    # images/<user id>/<file name>
+    op.execute(
+        """
+        UPDATE table_media
+        SET owner_id = substring(link FROM '^images/([0-9]+)/')::integer
+        WHERE blob_hash IS NULL
+          AND link ~ '^images/[0-9]+/[^/]+$'
+          AND EXISTS (
+              SELECT 1 FROM table_users
+              WHERE user_id = substring(link FROM '^images/([0-9]+)/')::integer
+          )
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint("table_media_owner_id_fkey", "table_media", type_="foreignkey")
+    op.drop_column("table_media", "owner_id")
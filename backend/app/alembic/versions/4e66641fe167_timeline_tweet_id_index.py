@@ -0,0 +1,24 @@
+"""timeline tweet id index
+
+Revision ID: 4e66641fe167
+Revises: f2e6471032e6
+Create Date: 2026-10-18 15:12:38.662051
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "4e66641fe167"
+down_revision = "f2e6471032e6"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_table_timelines_tweet_id", "table_timelines", ["tweet_id"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_table_timelines_tweet_id", table_name="table_timelines")
@@ -0,0 +1,57 @@
+"""home timeline
+
+Revision ID: 6fe5a2f64014
+Revises: aad4d07712a2
+Create Date: 2026-10-18 10:02:11.415297
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "6fe5a2f64014"
+down_revision = "aad4d07712a2"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "table_timelines",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("tweet_id", sa.Integer(), nullable=False),
+        sa.Column("author_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["author_id"], ["table_users.user_id"], ondelete="CASCADE"
+        ),
+        sa.ForeignKeyConstraint(
+            ["tweet_id"], ["table_tweets.tweet_id"], ondelete="CASCADE"
+        ),
+        sa.ForeignKeyConstraint(
+            ["user_id"], ["table_users.user_id"], ondelete="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("user_id", "tweet_id"),
+    )
+    op.create_index(
+        "ix_table_timelines_user_id_author_id",
+        "table_timelines",
+        ["user_id", "author_id"],
+        unique=False,
+    )
+    # fill timelines of existing followers
+    op.execute(
+        """
+        INSERT INTO table_timelines (user_id, tweet_id, author_id)
+        SELECT table_followers.follower_id,
+               table_tweets.tweet_id,
+               table_tweets.author_id
+        FROM table_followers
+        JOIN table_tweets ON table_tweets.author_id = table_followers.user_id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_table_timelines_user_id_author_id", table_name="table_timelines")
+    op.drop_table("table_timelines")
@@ -0,0 +1,43 @@
+"""media blobs
+
+Revision ID: 7452f8093b5e
+Revises: 85c8868e96ff
+Create Date: 2026-10-18 17:12:40.582913
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "7452f8093b5e"
+down_revision = "85c8868e96ff"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "table_media_blobs",
+        sa.Column("hash", sa.String(length=64), nullable=False),
+        sa.Column("link", sa.String(), nullable=False),
+        sa.Column("size", sa.Integer(), nullable=False),
+        sa.Column("ref_count", sa.Integer(), server_default="0", nullable=False),
+        sa.PrimaryKeyConstraint("hash"),
+    )
+    op.add_column(
+        "table_media", sa.Column("blob_hash", sa.String(length=64), nullable=True)
+    )
+    op.create_foreign_key(
+        "table_media_blob_hash_fkey",
+        "table_media",
+        "table_media_blobs",
+        ["blob_hash"],
+        ["hash"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint("table_media_blob_hash_fkey", "table_media", type_="foreignkey")
+    op.drop_column("table_media", "blob_hash")
+    op.drop_table("table_media_blobs")
@@ -0,0 +1,35 @@
+"""media variants
+
+Revision ID: 80a83368ca23
+Revises: 7452f8093b5e
+Create Date: 2026-10-18 17:48:05.316402
+
+"""
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "80a83368ca23"
+down_revision = "7452f8093b5e"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    for table_name in ("table_media_blobs", "table_media"):
+        op.add_column(
+            table_name,
+            sa.Column(
+                "variants",
+                postgresql.JSONB(astext_type=sa.Text()),
+                server_default=sa.text("'{}'::jsonb"),
+                nullable=False,
+            ),
+        )
+
+
+def downgrade() -> None:
+    op.drop_column("table_media", "variants")
+    op.drop_column("table_media_blobs", "variants")
@@ -0,0 +1,27 @@
+"""tweet author id index
+
+Revision ID: 85c8868e96ff
+Revises: 4e66641fe167
+Create Date: 2026-10-18 16:03:52.118620
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "85c8868e96ff"
+down_revision = "4e66641fe167"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_table_tweets_author_id_tweet_id",
+        "table_tweets",
+        ["author_id", "tweet_id"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_table_tweets_author_id_tweet_id", table_name="table_tweets")
@@ -0,0 +1,48 @@
+"""follower and like indexes
+
+Revision ID: a213abf380c5
+Revises: 46eb093d9010
+Create Date: 2026-10-18 21:37:15.402871
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "a213abf380c5"
+down_revision = "46eb093d9010"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY keeps the tables writable, but can't run in a transaction.
+    # A failed build leaves an invalid index, drop it before the next upgrade.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_table_followers_follower_id_user_id",
+            "table_followers",
+            ["follower_id", "user_id"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_table_likes_user_id_tweet_id",
+            "table_likes",
+            ["user_id", "tweet_id"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_table_likes_user_id_tweet_id",
+            table_name="table_likes",
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "ix_table_followers_follower_id_user_id",
+            table_name="table_followers",
+            postgresql_concurrently=True,
+        )
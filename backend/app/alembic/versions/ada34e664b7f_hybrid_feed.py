@@ -0,0 +1,58 @@
+"""hybrid feed
+
+Revision ID: ada34e664b7f
+Revises: 6fe5a2f64014
+Create Date: 2026-10-18 11:20:47.031288
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "ada34e664b7f"
+down_revision = "6fe5a2f64014"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "table_users",
+        sa.Column("follower_count", sa.Integer(), server_default="0", nullable=False),
+    )
+    op.execute(
+        """
+        UPDATE table_users
+        SET follower_count = counts.follower_count
+        FROM (
+            SELECT user_id, count(*) AS follower_count
+            FROM table_followers
+            GROUP BY user_id
+        ) AS counts
+        WHERE table_users.user_id = counts.user_id
+        """
+    )
+    op.add_column(
+        "table_tweets",
+        sa.Column(
+            "fanned_out", sa.Boolean(), server_default=sa.text("true"), nullable=False
+        ),
+    )
+    op.create_index(
+        "ix_table_tweets_pulled_author_id_tweet_id",
+        "table_tweets",
+        ["author_id", "tweet_id"],
+        unique=False,
+        postgresql_where=sa.text("NOT fanned_out"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_table_tweets_pulled_author_id_tweet_id",
+        table_name="table_tweets",
+        postgresql_where=sa.text("NOT fanned_out"),
+    )
+    op.drop_column("table_tweets", "fanned_out")
+    op.drop_column("table_users", "follower_count")
@@ -0,0 +1,39 @@
+"""media created at
+
+Revision ID: dfbc28761446
+Revises: 4ddd9f759e8a
+Create Date: 2026-10-18 18:57:12.640871
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "dfbc28761446"
+down_revision = "4ddd9f759e8a"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "table_media",
+        sa.Column(
+            "created_at", sa.DateTime(), server_default=sa.func.now(), nullable=False
+        ),
+    )
+    op.create_index(
+        "ix_table_media_tweet_relation_media_id",
+        "table_media_tweet_relation",
+        ["media_id"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_table_media_tweet_relation_media_id",
+        table_name="table_media_tweet_relation",
+    )
+    op.drop_column("table_media", "created_at")
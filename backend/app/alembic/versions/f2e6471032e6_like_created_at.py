@@ -0,0 +1,36 @@
+"""like created at
+
+Revision ID: f2e6471032e6
+Revises: 00d9f0e3900e
+Create Date: 2026-10-18 13:55:19.204466
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "f2e6471032e6"
+down_revision = "00d9f0e3900e"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "table_likes",
+        sa.Column(
+            "created_at", sa.DateTime(), server_default=sa.func.now(), nullable=False
+        ),
+    )
+    op.create_index(
+        "ix_table_likes_tweet_id_created_at",
+        "table_likes",
+        ["tweet_id", sa.text("created_at DESC")],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_table_likes_tweet_id_created_at", table_name="table_likes")
+    op.drop_column("table_likes", "created_at")
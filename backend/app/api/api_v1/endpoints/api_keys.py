@@ -0,0 +1,74 @@
+from typing import Any
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api import dependencies, utils
+from cache import api_key_cache
+from crud import crud_api_key
+from schemas import api_key_schema, user_schema
+
+router = APIRouter(prefix="/users/me/api_keys")
+
+
+@router.post(
+    "",
+    description="Creates new api key, the key is returned only once",
+    response_model=api_key_schema.CreateApiKeyModelOut,
+    status_code=status.HTTP_201_CREATED,
+)
+async def create_api_key(
+    api_key_data: api_key_schema.CreateApiKeyModelIn,
+    session: AsyncSession = Depends(dependencies.get_db_session),
+    current_user: user_schema.Principal = Depends(dependencies.get_current_user),
+) -> dict[str, Any]:
+    api_key, key = await crud_api_key.create_api_key(
+        session=session, user_id=current_user.user_id, name=api_key_data.name
+    )
+
+    return utils.reformat_any_response(
+        key=["api_key_id", "api_key"], value=[api_key.api_key_id, key]
+    )
+
+
+@router.get(
+    "",
+    description="Api keys of current user",
+    response_model=api_key_schema.ApiKeysResponseModel,
+    response_model_by_alias=False,
+)
+async def get_api_keys(
+    session: AsyncSession = Depends(dependencies.get_db_session),
+    current_user: user_schema.Principal = Depends(dependencies.get_current_user),
+) -> dict[str, Any]:
+    api_keys = await crud_api_key.read_api_keys(
+        session=session, user_id=current_user.user_id
+    )
+    api_keys_as_json = map(jsonable_encoder, api_keys)
+
+    return utils.reformat_any_response(key="api_keys", value=list(api_keys_as_json))
+
+
+@router.delete(
+    "/{api_key_id}",
+    description="Revokes api key",
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def revoke_api_key(
+    api_key_id: int,
+    session: AsyncSession = Depends(dependencies.get_db_session),
+    current_user: user_schema.Principal = Depends(dependencies.get_current_user),
+) -> dict[str, Any]:
+    key_hash = await crud_api_key.revoke_api_key(
+        session=session, user_id=current_user.user_id, api_key_id=api_key_id
+    )
+    if key_hash is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Api key does not exists or is revoked",
+        )
+    # other workers stop accepting the key after API_KEY_CACHE_TTL
+    api_key_cache.invalidate(key_hash)
+
+    return {"result": True}
@@ -5,8 +5,8 @@ from starlette import status
 from api import utils
 from api.dependencies import get_current_user, get_db_session, get_file
 from crud import crud_media
-from db_models.user_model import User
 from schemas.media_schema import MediaModelOut
+from schemas.user_schema import Principal
 
 router = APIRouter(prefix="/medias")
 
@@ -15,7 +15,7 @@ router = APIRouter(prefix="/medias")
 async def create_medias(
     file_data: dict = Depends(get_file),
     session: AsyncSession = Depends(get_db_session),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ) -> dict[str, int]:
     media = await crud_media.create_media(
         session=session, file_data=file_data, user_id=current_user.user_id
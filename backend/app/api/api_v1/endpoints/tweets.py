@@ -1,13 +1,18 @@
-from typing import Any
+import asyncio
+import json
+from typing import Any, AsyncIterator
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.encoders import jsonable_encoder
 from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.responses import JSONResponse, Response, StreamingResponse
 
 from api import dependencies, utils
-from crud import crud_tweet
-from db_models.user_model import User
-from schemas import tweet_schema
+from cache import feed_cache
+from configs import app_config
+from crud import crud_tweet, crud_user
+from feed_stream.broker import RESYNC, Subscription, TooManyStreamsError, broker
+from schemas import like_schema, tweet_schema, user_schema
 
 router = APIRouter(prefix="/tweets")
 
@@ -21,12 +26,12 @@ router = APIRouter(prefix="/tweets")
 async def create_tweet(
     tweet_data: tweet_schema.CreateTweetModelIn,
     session: AsyncSession = Depends(dependencies.get_db_session),
-    current_user: User = Depends(dependencies.get_current_user),
+    current_user: user_schema.Principal = Depends(dependencies.get_current_user),
 ) -> dict[str, Any]:
     tweet = await crud_tweet.create_tweet(
         session=session,
         tweet_data=tweet_data,
-        author=current_user,
+        author=current_user.user_id,
     )
 
     return utils.reformat_any_response(key="tweet_id", value=tweet.tweet_id)
@@ -38,7 +43,7 @@ async def create_tweet(
 async def delete_tweet(
     tweet_id: int,
     session: AsyncSession = Depends(dependencies.get_db_session),
-    current_user: User = Depends(dependencies.get_current_user),
+    current_user: user_schema.Principal = Depends(dependencies.get_current_user),
 ) -> dict[str, Any]:
     result = await crud_tweet.delete_tweet(
         session=session, tweet_id=tweet_id, user_id=current_user.user_id
@@ -56,24 +61,151 @@ async def delete_tweet(
     "",
     response_model=tweet_schema.TweetsResponseModel,
     response_model_by_alias=False,
-    description="Obtain user feed with all the tweets of the users who user follows",
+    description="Obtain user feed with all the tweets of the users who user follows. "
+    "With since_id only tweets newer than since_id, from newest to oldest",
 )
 async def get_feed(
     session: AsyncSession = Depends(dependencies.get_db_session),
-    current_user: User = Depends(dependencies.get_current_user),
+    current_user: user_schema.Principal = Depends(dependencies.get_current_user),
     pagination: dict = Depends(dependencies.pagination),
-) -> dict[str, Any]:
+    since_id: int | None = None,
+) -> JSONResponse:
     user = current_user
+    cursor = pagination.get("cursor")
+    limit = 100 if pagination.get("limit") is None else pagination["limit"]
 
-    tweets_as_obj = await crud_tweet.read_feed(
-        session=session,
+    if cursor is not None and len(cursor) != 2:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor",
+        )
+
+    offset = 0 if pagination.get("offset") is None else pagination["offset"]
+    cache_key = await feed_cache.make_key(
         user_id=user.user_id,
+        params="{}:{}:{}:{}".format(offset, limit, cursor, since_id),
+    )
+    cached_content = await feed_cache.read(cache_key)
+    if cached_content is not None:
+        return JSONResponse(content=cached_content)
+
+    if since_id is not None:
+        tweets_as_obj = await crud_tweet.read_new_tweets(
+            session=session, user_id=user.user_id, since_id=since_id, limit=limit
+        )
+    else:
+        tweets_as_obj = await crud_tweet.read_feed(
+            session=session,
+            user_id=user.user_id,
+            offset=offset,
+            limit=limit,
+            after=cursor,
+        )
+    tweets_as_json = map(jsonable_encoder, tweets_as_obj)
+
+    next_cursor = None
+    if since_id is None and tweets_as_obj and len(tweets_as_obj) == limit:
+        next_cursor = utils.encode_cursor(*crud_tweet.feed_rank(tweets_as_obj[-1]))
+
+    response = tweet_schema.TweetsResponseModel.parse_obj(
+        utils.reformat_any_response(
+            key=["tweets", "next_cursor"], value=[list(tweets_as_json), next_cursor]
+        )
+    )
+    # cached content is serialized once, hits skip the response model
+    content = jsonable_encoder(response, by_alias=False)
+    await feed_cache.write(cache_key, content)
+
+    return JSONResponse(content=content)
+
+
+@router.head(
+    "",
+    description="Count new tweets of the feed, returned in X-New-Tweets header",
+)
+async def count_new_tweets(
+    since_id: int,
+    session: AsyncSession = Depends(dependencies.get_db_session),
+    current_user: user_schema.Principal = Depends(dependencies.get_current_user),
+) -> Response:
+    count = await crud_tweet.count_new_tweets(
+        session=session, user_id=current_user.user_id, since_id=since_id
+    )
+    return Response(headers={"X-New-Tweets": str(count)})
+
+
+@router.get(
+    "/stream",
+    description="Server-sent events with ids of the new tweets of the feed. "
+    "Event 'resync' means the client fell behind and has to reload the feed",
+)
+async def stream_feed(
+    session: AsyncSession = Depends(dependencies.get_db_session),
+    current_user: user_schema.Principal = Depends(dependencies.get_current_user),
+) -> StreamingResponse:
+    following_ids = await crud_user.read_following_ids(
+        session=session, user_id=current_user.user_id
+    )
+    try:
+        subscription = broker.subscribe(
+            user_id=current_user.user_id, author_ids=following_ids
+        )
+    except TooManyStreamsError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many feed streams, try again later",
+        )
+
+    return StreamingResponse(
+        _feed_events(subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _feed_events(subscription: Subscription) -> AsyncIterator[str]:
+    try:
+        while True:
+            try:
+                event = await asyncio.wait_for(
+                    subscription.queue.get(),
+                    timeout=app_config.STREAM_KEEPALIVE_INTERVAL,
+                )
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+
+            if event is RESYNC:
+                yield "event: resync\ndata: {}\n\n"
+                return
+            yield "event: tweet\nid: {}\ndata: {}\n\n".format(
+                event["tweet_id"], json.dumps(event)
+            )
+    finally:
+        broker.unsubscribe(subscription)
+
+
+@router.get(
+    "/{tweet_id}/likes",
+    response_model=like_schema.LikesResponseModel,
+    response_model_by_alias=False,
+    description="Obtain users who liked the tweet, most recent first",
+)
+async def get_likes(
+    tweet_id: int,
+    session: AsyncSession = Depends(dependencies.get_db_session),
+    current_user: user_schema.Principal = Depends(dependencies.get_current_user),
+    pagination: dict = Depends(dependencies.pagination),
+) -> dict[str, Any]:
+    likes = await crud_tweet.read_likes(
+        session=session,
+        tweet_id=tweet_id,
         offset=0 if pagination.get("offset") is None else pagination["offset"],
         limit=100 if pagination.get("limit") is None else pagination["limit"],
     )
-    tweets_as_json = map(jsonable_encoder, tweets_as_obj)
+    likes_as_json = map(jsonable_encoder, likes)
 
-    return utils.reformat_any_response(key="tweets", value=list(tweets_as_json))
+    return utils.reformat_any_response(key="likes", value=list(likes_as_json))
 
 
 @router.post(
@@ -84,7 +216,7 @@ async def get_feed(
 async def add_like(
     tweet_id: int,
     session: AsyncSession = Depends(dependencies.get_db_session),
-    current_user: User = Depends(dependencies.get_current_user),
+    current_user: user_schema.Principal = Depends(dependencies.get_current_user),
 ) -> dict[str, Any]:
     user = current_user
     await crud_tweet.add_like(session=session, tweet_id=tweet_id, user_id=user.user_id)
@@ -99,7 +231,7 @@ async def add_like(
 async def delete_like(
     tweet_id: int,
     session: AsyncSession = Depends(dependencies.get_db_session),
-    current_user: User = Depends(dependencies.get_current_user),
+    current_user: user_schema.Principal = Depends(dependencies.get_current_user),
 ) -> dict[str, Any]:
     user = current_user
     await crud_tweet.remove_like(
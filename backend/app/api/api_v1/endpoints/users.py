@@ -1,10 +1,10 @@
 from typing import Any
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from api import dependencies, utils
-from crud import crud_user
+from crud import crud_api_key, crud_user
 from custom_exc.no_user_found import NoUserFoundError
 from db_models.user_model import User
 from schemas import user_schema
@@ -19,21 +19,9 @@ router = APIRouter(prefix="/users")
     description="Profile of current user",
 )
 async def show_me(
-    session: AsyncSession = Depends(dependencies.get_db_session),
-    curren_user: User = Depends(dependencies.get_current_user),
+    user: User = Depends(dependencies.get_current_db_user),
 ) -> dict[str, Any]:
-    if curren_user:
-        user = await crud_user.read_user(
-            session=session,
-            user_id=curren_user.user_id,
-            include_relations="all",
-        )
-        return utils.reformat_any_response(key="user", value=user)
-    else:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not authenticated",
-        )
+    return utils.reformat_any_response(key="user", value=user)
 
 
 @router.get(
@@ -55,24 +43,31 @@ async def get_user(
         raise NoUserFoundError(user_id)
 
 
-@router.post("/", status_code=status.HTTP_201_CREATED)
+@router.post(
+    "/",
+    description="Creates new user and its first api key, returned only once",
+    status_code=status.HTTP_201_CREATED,
+)
 async def create_user(
     user_data: user_schema.CreateUserModel,
     session: AsyncSession = Depends(dependencies.get_db_session),
 ) -> dict[str, Any]:
     user = await crud_user.create_user(session=session, user_data=user_data)
+    _, key = await crud_api_key.create_api_key(session=session, user_id=user.user_id)
 
-    return utils.reformat_any_response(user.user_id, "user_id")
+    return utils.reformat_any_response(
+        key=["user_id", "api_key"], value=[user.user_id, key]
+    )
 
 
 @router.post("/{user_id}/follow", description="Follow user")
 async def follow_user(
     user_id: int,
     session: AsyncSession = Depends(dependencies.get_db_session),
-    curren_user: User = Depends(dependencies.get_current_user),
+    curren_user: user_schema.Principal = Depends(dependencies.get_current_user),
 ) -> dict[str, bool]:
     await crud_user.follow_user(
-        session=session, user_who_follow=curren_user, user_id=user_id
+        session=session, user_who_follow=curren_user.user_id, user_id=user_id
     )
 
     return {"result": True}
@@ -82,10 +77,10 @@ async def follow_user(
 async def unfollow_user(
     user_id: int,
     session: AsyncSession = Depends(dependencies.get_db_session),
-    curren_user: User = Depends(dependencies.get_current_user),
+    curren_user: user_schema.Principal = Depends(dependencies.get_current_user),
 ) -> dict[str, bool]:
     await crud_user.unfollow(
-        session=session, user_who_unfollow=curren_user, user_id=user_id
+        session=session, user_who_unfollow=curren_user.user_id, user_id=user_id
     )
 
     return {"result": True}
@@ -1,5 +1,6 @@
 from fastapi import APIRouter
 
+import metrics
 from configs import app_config
 
 router = APIRouter()
@@ -14,6 +15,11 @@ async def get_configs():
     }
 
 
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return metrics.snapshot()
+
+
 @router.get("/sentry-debug", include_in_schema=False)
 async def trigger_error():
     division_by_zero = 1 / 0
@@ -9,6 +9,7 @@ from starlette.responses import JSONResponse
 
 from configs.app_config import DEBUG
 from custom_exc.db_exception import DbIntegrityError
+from custom_exc.no_media_found import NoMediaFoundError
 from custom_exc.no_user_found import NoUserFoundError
 
 logger = getLogger("main.exception_handlers")
@@ -42,6 +43,19 @@ async def no_user_found_handler(_, exc: NoUserFoundError) -> JSONResponse:
     )
 
 
+async def no_media_found_handler(_, exc: NoMediaFoundError) -> JSONResponse:
+    return JSONResponse(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        content=jsonable_encoder(
+            {
+                "result": False,
+                "error_type": "No media found error",
+                "error_message": exc.error_message,
+            }
+        ),
+    )
+
+
 async def http_exceptions_handler(request: Request, exc: HTTPException) -> JSONResponse:
     error_message = f"{exc.detail}. URL={request.url}"
     logger.error(error_message)
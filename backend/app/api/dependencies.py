@@ -1,7 +1,9 @@
+import hashlib
 from logging import getLogger
-from typing import Any, Callable
+from typing import Any, AsyncIterator, Callable
 
-from fastapi import Depends, UploadFile
+import aiofiles
+from fastapi import Depends, Query, UploadFile
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from sqlalchemy.exc import IntegrityError
@@ -11,22 +13,39 @@ from starlette import status
 from starlette.exceptions import HTTPException
 from starlette.requests import Request
 
+import metrics
+from api import utils
+from cache import api_key_cache, token_cache, user_cache
 from configs import app_config
-from crud import crud_user
+from crud import crud_api_key, crud_user
 from custom_exc.db_exception import DbIntegrityError
 from custom_exc.no_user_found import NoUserFoundError
 from db.session import async_session
 from db_models.user_model import User
+from schemas.user_schema import Principal
+from storage import fs
 
 logger = getLogger("main.dependencies")
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
+# key of the user 1 for the demo frontend, accepted with LEGACY_API_KEYS only
+LEGACY_API_KEY = "test"
+
 
 async def get_db_session():
+    """
+    Session of the request. It checks out a connection on the first query of
+    a transaction and returns it when the transaction of the CRUD call ends,
+    the session itself is closed only after the response is sent.
+    """
     try:
         async with async_session() as session:
             yield session
+            if session.in_transaction():
+                # connection was held during serialization of the response
+                metrics.increment("db_session.unreleased_transactions")
+                logger.warning("Transaction of the request was left open")
     except IntegrityError as exc:
         raise DbIntegrityError(exc.args)
     except FlushError as exc:
@@ -39,14 +58,21 @@ async def get_db_session():
 async def get_user_by_jwt_token(
     token: str = Depends(oauth2_scheme),
     db_session: AsyncSession = Depends(get_db_session),
-) -> User:
-    """Authentication with JWT token"""
+) -> Principal:
+    """
+    Authentication with JWT token. Principal is built from the claims, so
+    verified tokens need no database access.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
+    principal = token_cache.read(token)
+    if principal is not None:
+        return principal
+
     if app_config.SECRET_KEY is None:
         raise JWTError("SECRET_KEY is not set")
 
@@ -56,24 +82,30 @@ async def get_user_by_jwt_token(
         )
         user_id = payload.get("user_id")
     except JWTError:
-        print("jwt error")
+        logger.debug("Invalid JWT token")
         raise credentials_exception
 
     if user_id is None:
         raise credentials_exception
 
-    user: User | None = await crud_user.read_user(user_id=user_id, session=db_session)
+    if "user_name" in payload:
+        principal = Principal(user_id=user_id, user_name=payload["user_name"])
+    else:
+        # tokens issued before user_name claim
+        principal = await resolve_principal(session=db_session, user_id=user_id)
 
-    if user is None:
+    if principal is None:
         raise credentials_exception
 
-    return user
+    token_cache.write(token, principal, expires_at=payload.get("exp"))
+
+    return principal
 
 
 async def get_current_user_by_apikey(
     request: Request,
     session: AsyncSession = Depends(get_db_session),
-) -> User:
+) -> Principal:
     """Authentication with api-key"""
     api_key = request.headers.mutablecopy().get("api-key")
     if api_key is None:
@@ -81,30 +113,58 @@ async def get_current_user_by_apikey(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Api-key is omitted.",
         )
-    if api_key == "test":
-        api_key = "1"
-    # TODO хранить api-key в базе
+    if app_config.LEGACY_API_KEYS and api_key == LEGACY_API_KEY:
+        principal = await resolve_principal(session=session, user_id=1)
+    else:
+        principal = await resolve_api_key(session=session, api_key=api_key)
 
-    try:
-        user_id = int(api_key)
-    except ValueError:
+    if principal is None:
+        error_message = "Wrong api-key, user not found. URL=%s" % request.url
+        logger.error(error_message)
         raise NoUserFoundError
 
+    return principal
+
+
+async def resolve_api_key(session: AsyncSession, api_key: str) -> Principal | None:
+    """
+    Principal of the active api key from the per-worker cache, the key is read
+    on miss. Usage of the key is written back in batches.
+    """
+    key_hash = crud_api_key.hash_key(api_key)
+    cached = api_key_cache.read(key_hash)
+    if cached is None:
+        found = await crud_api_key.read_user_by_key_hash(
+            session=session, key_hash=key_hash
+        )
+        if found is None:
+            return None
+        api_key_id, user = found
+        cached = (api_key_id, Principal.from_orm(user))
+        api_key_cache.write(key_hash, *cached)
+
+    api_key_id, principal = cached
+    api_key_cache.mark_used(api_key_id)
+    return principal
+
+
+async def resolve_principal(session: AsyncSession, user_id: int) -> Principal | None:
+    """Principal from the per-worker cache, the user is read on miss"""
+    principal = user_cache.read(user_id)
+    if principal is not None:
+        return principal
+
     user: User | None = await crud_user.read_user(
         session=session,
         include_relations=None,
         user_id=user_id,
     )
-
     if user is None:
-        error_message = "Wrong api-key, user not found. ApiKey=%s, URL=%s" % (
-            api_key,
-            request.url,
-        )
-        logger.error(error_message)
-        raise NoUserFoundError
+        return None
 
-    return user
+    principal = Principal.from_orm(user)
+    user_cache.write(principal)
+    return principal
 
 
 def get_auth_dependency() -> Callable:
@@ -116,39 +176,85 @@ def get_auth_dependency() -> Callable:
         return get_current_user_by_apikey
 
 
-async def get_current_user(curren_user=Depends(get_auth_dependency())) -> User:
+async def get_current_user(
+    curren_user=Depends(get_auth_dependency()),
+) -> Principal:
     return curren_user
 
 
+async def get_current_db_user(
+    principal: Principal = Depends(get_current_user),
+    session: AsyncSession = Depends(get_db_session),
+) -> User:
+    """Full user with relations, for the endpoints the principal is not enough"""
+    user: User | None = await crud_user.read_user(
+        session=session,
+        user_id=principal.user_id,
+        include_relations="all",
+    )
+    if user is None:
+        raise NoUserFoundError(principal.user_id)
+
+    return user
+
+
 async def pagination(
-    offset: int | None = None, limit: int | None = None
-) -> dict[str, int | None]:
-    """Pagination dependency"""
+    offset: int | None = Query(None, ge=1),
+    limit: int | None = Query(None, ge=1),
+    cursor: str | None = None,
+) -> dict[str, Any]:
+    """
+    Pagination dependency, offset is the number of the page starting from 1.
+    Cursor returned with the previous page takes precedence over offset.
+    """
+    if cursor is not None:
+        try:
+            keys = utils.decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor",
+            )
+        return {"offset": None, "limit": limit, "cursor": keys}
+
     if limit is None:
         offset = None
-        return {"offset": offset, "limit": limit}
+        return {"offset": offset, "limit": limit, "cursor": None}
 
     if offset is not None:
         offset = limit * (offset - 1)
     else:
         offset = None
 
-    return {"offset": offset, "limit": limit}
+    return {"offset": offset, "limit": limit, "cursor": None}
 
 
-async def get_file(file: UploadFile) -> dict[str, Any]:
-    """Uploads file considering file size constraint"""
-    chunk = await file.read(1024)
-    content: bytes = chunk
-    real_size = len(chunk)
+async def get_file(file: UploadFile) -> AsyncIterator[dict[str, Any]]:
+    """
+    Streams uploaded file to a temporary file considering file size constraint.
+    The temporary file is removed after the response unless it was moved.
+    """
+    tmp_path = await fs.make_temp_file(app_config.UPLOAD_TMP_DIR)
 
-    while chunk := await file.read(1024):
-        real_size += len(chunk)
-        if real_size > app_config.MAX_IMG_SIZE:
-            raise HTTPException(
-                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                detail="File too large",
-            )
-        content += chunk
-
-    return {"content": content, "filename": file.filename}
+    try:
+        real_size = 0
+        content_hash = hashlib.sha256()
+        async with aiofiles.open(tmp_path, mode="wb") as tmp_file:
+            while chunk := await file.read(app_config.UPLOAD_CHUNK_SIZE):
+                real_size += len(chunk)
+                if real_size > app_config.MAX_IMG_SIZE:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail="File too large",
+                    )
+                content_hash.update(chunk)
+                await tmp_file.write(chunk)
+
+        yield {
+            "path": tmp_path,
+            "filename": file.filename,
+            "size": real_size,
+            "sha256": content_hash.hexdigest(),
+        }
+    finally:
+        await fs.remove(tmp_path, missing_ok=True)
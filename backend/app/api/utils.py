@@ -1,5 +1,11 @@
+import base64
+import json
 from typing import Any, List
 
+# Cursor keys are bound to int4 columns, wider values must not reach the database
+CURSOR_KEY_MIN = -(2**31)
+CURSOR_KEY_MAX = 2**31 - 1
+
 
 def reformat_any_response(
     value: Any | List[Any], key: str | List[str] | None = None
@@ -19,3 +25,28 @@ def reformat_error(exc: tuple) -> str:
         return exc[0][0]
     except IndexError:
         return "error massage failed"
+
+
+def encode_cursor(*keys: int) -> str:
+    """Packs sort keys of the last item of the page into opaque cursor token"""
+    return base64.urlsafe_b64encode(json.dumps(keys).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[int, ...]:
+    try:
+        keys = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+    if not isinstance(keys, list) or not all(_is_cursor_key(key) for key in keys):
+        raise ValueError("Invalid cursor")
+
+    return tuple(keys)
+
+
+def _is_cursor_key(key: Any) -> bool:
+    return (
+        isinstance(key, int)
+        and not isinstance(key, bool)
+        and CURSOR_KEY_MIN <= key <= CURSOR_KEY_MAX
+    )
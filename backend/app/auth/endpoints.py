@@ -5,8 +5,14 @@ from starlette.responses import HTMLResponse
 from starlette.templating import Jinja2Templates
 
 from api.dependencies import get_db_session
-from auth.utils import create_access_token
+from auth.utils import (
+    check_password,
+    create_access_token,
+    hash_password,
+    needs_rehash,
+)
 from crud import crud_user
+from db import routing
 from db_models.user_model import User
 
 auth_router = APIRouter(prefix="/auth", tags=["auth"])
@@ -25,20 +31,28 @@ async def get_access_token(
     :param session: Sqlalchemy session.
     :return: access token
     """
-    user: User | None = await crud_user.read_user_by_username(
-        session=session,
-        username=form_data.username,
-    )
+    # users log in right after sign up, the replica could lag behind
+    with routing.use_primary():
+        user: User | None = await crud_user.read_user_by_username(
+            session=session,
+            username=form_data.username,
+        )
     if user is None:
         raise HTTPException(status_code=400, detail="Wrong username or password")
 
-    # if not verify_password(form_data.password, user.hashed_password):
-    #     raise HTTPException(
-    #         status_code=400,
-    #         detail="Wrong username or password"
-    #     )
+    if not await check_password(form_data.password, user.password):
+        raise HTTPException(status_code=400, detail="Wrong username or password")
+
+    if needs_rehash(user.password):
+        await crud_user.update_password(
+            session=session,
+            user_id=user.user_id,
+            hashed_password=await hash_password(form_data.password),
+        )
 
-    access_token = create_access_token({"user_id": user.user_id})
+    access_token = create_access_token(
+        {"user_id": user.user_id, "user_name": user.user_name}
+    )
 
     return {"access_token": access_token, "token_type": "Bearer"}
 
@@ -1,14 +1,35 @@
+import asyncio
+import hmac
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from time import perf_counter
+from typing import Any, Callable, TypeVar
 
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 
+import metrics
 from configs import app_config
 
+T = TypeVar("T")
+
 password_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt takes ~100ms of CPU and releases the GIL, it runs in its own threads
+# so a login storm does not block the event loop or the other pools
+_hash_executor = ThreadPoolExecutor(
+    max_workers=app_config.PASSWORD_HASH_WORKERS, thread_name_prefix="password_hash"
+)
+_hash_semaphore = asyncio.Semaphore(app_config.PASSWORD_HASH_WORKERS)
+_waiting = 0
+
+metrics.register_gauge("password_hash.waiting", lambda: _waiting)
+
 
 def verify_password(password: str, hashed_password: str) -> bool:
+    if password_context.identify(hashed_password) is None:
+        # password stored before hashing was enabled
+        return hmac.compare_digest(password.encode(), hashed_password.encode())
     return password_context.verify(secret=password, hash=hashed_password)
 
 
@@ -16,6 +37,45 @@ def get_hash(password: str) -> str:
     return password_context.hash(secret=password)
 
 
+def needs_rehash(hashed_password: str) -> bool:
+    if password_context.identify(hashed_password) is None:
+        return True
+    return password_context.needs_update(hashed_password)
+
+
+async def check_password(password: str, hashed_password: str) -> bool:
+    """verify_password executed in the password hashing pool"""
+    return await _run_in_hash_pool(verify_password, password, hashed_password)
+
+
+async def hash_password(password: str) -> str:
+    """get_hash executed in the password hashing pool"""
+    return await _run_in_hash_pool(get_hash, password)
+
+
+async def _run_in_hash_pool(func: Callable[..., T], *args: Any) -> T:
+    """
+    At most PASSWORD_HASH_WORKERS hashes are computed at a time, the rest wait
+    for the semaphore. Observes the wait and the hashing time.
+    """
+    global _waiting
+
+    loop = asyncio.get_running_loop()
+    start = perf_counter()
+    _waiting += 1
+    try:
+        await _hash_semaphore.acquire()
+    finally:
+        _waiting -= 1
+    metrics.observe("password_hash.wait_seconds", perf_counter() - start)
+
+    try:
+        with metrics.timer("password_hash.seconds"):
+            return await loop.run_in_executor(_hash_executor, func, *args)
+    finally:
+        _hash_semaphore.release()
+
+
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
     to_encode["exp"] = datetime.utcnow() + timedelta(
@@ -0,0 +1,140 @@
+"""
+Python side cost of the hot queries: statements rebuilt on every call, as the
+CRUD functions did before, against statements built once at import.
+
+Every execution builds the cache key of the statement to find its compiled
+form, the cache key of a prebuilt statement is memoized. Compilation is what
+every call would pay without the compiled cache.
+
+Run from backend/app: python -m benchmarks.statement_cache
+"""
+import timeit
+from functools import partial
+from typing import Callable
+
+from sqlalchemy import Select, desc, select, true
+from sqlalchemy.dialects.postgresql import asyncpg
+from sqlalchemy.orm import aliased, joinedload, selectinload
+
+from configs import app_config
+from crud import crud_tweet, crud_user
+from db.base import Base  # noqa: F401, configures all mappers
+from db_models.follower_model import Follower
+from db_models.like_model import Like
+from db_models.timeline_model import TimelineEntry
+from db_models.tweet_model import Tweet
+from db_models.user_model import User
+
+NUMBER = 2000
+
+
+def rebuilt_ranked_tweets() -> Select:
+    return (
+        select(Tweet)
+        .where(
+            Tweet.tweet_id.in_(
+                select(TimelineEntry.tweet_id).where(TimelineEntry.user_id == 1)
+            )
+        )
+        .options(joinedload(Tweet.author), selectinload(Tweet.attachments))
+        .order_by(desc(Tweet.like_count), desc(Tweet.tweet_id))
+        .limit(100)
+    )
+
+
+def rebuilt_pulled_tweets() -> Select:
+    return (
+        select(Tweet)
+        .where(
+            ~Tweet.fanned_out,
+            Tweet.author_id.in_(
+                select(Follower.user_id).where(Follower.follower_id == 1)
+            ),
+        )
+        .options(joinedload(Tweet.author), selectinload(Tweet.attachments))
+        .order_by(desc(Tweet.like_count), desc(Tweet.tweet_id))
+        .limit(100)
+    )
+
+
+def rebuilt_preview_likes() -> Select:
+    recent_likes = (
+        select(Like)
+        .where(Like.tweet_id == Tweet.tweet_id)
+        .order_by(desc(Like.created_at))
+        .limit(app_config.FEED_LIKES_PREVIEW_SIZE)
+        .lateral()
+    )
+    # lateral is a valid alias, the stubs accept only subqueries and aliases
+    recent_like = aliased(Like, recent_likes)  # type: ignore[call-overload]
+    return (
+        select(recent_like)
+        .select_from(Tweet)
+        .join(recent_likes, true())
+        .where(Tweet.tweet_id.in_(list(range(100))))
+        .options(joinedload(recent_like.user))
+    )
+
+
+def rebuilt_user() -> Select:
+    return (
+        select(User)
+        .where(User.user_id == 1)
+        .options(selectinload(User.followers), selectinload(User.following))
+    )
+
+
+QUERIES: dict[str, tuple[Callable[[], Select], Select]] = {
+    "feed pushed tweets": (
+        rebuilt_ranked_tweets,
+        crud_tweet.RANKED_TWEETS_STATEMENTS["pushed"],
+    ),
+    "feed pulled tweets": (
+        rebuilt_pulled_tweets,
+        crud_tweet.RANKED_TWEETS_STATEMENTS["pulled"],
+    ),
+    "feed preview likes": (
+        rebuilt_preview_likes,
+        crud_tweet.PREVIEW_LIKES_STATEMENT,
+    ),
+    "user with relations": (rebuilt_user, crud_user.READ_USER_STATEMENTS["all"]),
+}
+
+
+def cache_key(statement: Select) -> object:
+    # looked up on every call, the memoized key replaces the method of the
+    # instance after the first call, a bound method would bypass it
+    return statement._generate_cache_key()
+
+
+def rebuilt_cache_key(rebuild: Callable[[], Select]) -> object:
+    return rebuild()._generate_cache_key()
+
+
+def per_call(func: Callable[[], object]) -> float:
+    """Microseconds per call"""
+    return timeit.timeit(func, number=NUMBER) / NUMBER * 1e6
+
+
+def main() -> None:
+    dialect = asyncpg.dialect()
+    print(
+        "{:<22}{:>14}{:>14}{:>14}".format(
+            "query, us/call", "rebuilt", "prebuilt", "compile"
+        )
+    )
+    for name, (rebuild, statement) in QUERIES.items():
+        # warm up, the first execution of the app memoizes the cache key
+        cache_key(statement)
+        rebuilt = per_call(partial(rebuilt_cache_key, rebuild))
+        prebuilt = per_call(partial(cache_key, statement))
+        compiled = per_call(partial(statement.compile, dialect=dialect))
+        print(
+            "{:<22}{:>14.1f}{:>14.1f}{:>14.1f}".format(
+                name, rebuilt, prebuilt, compiled
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Per-worker cache of the principals by api key hash and the last usage of the
+keys, written back to the database in batches.
+"""
+from datetime import datetime
+
+import metrics
+from cache.lru_cache import TTLLRUCache
+from configs import app_config
+from schemas.user_schema import Principal
+
+api_key_cache = TTLLRUCache(
+    max_size=app_config.API_KEY_CACHE_MAX_SIZE, ttl=app_config.API_KEY_CACHE_TTL
+)
+# last usage of the keys since the previous write back, by api key id
+_last_used: dict[int, datetime] = {}
+
+metrics.register_gauge("api_key_cache.size", lambda: len(api_key_cache))
+
+
+def read(key_hash: str) -> tuple[int, Principal] | None:
+    """:return: api key id and its principal"""
+    item = api_key_cache.get(key_hash)
+    metrics.increment("api_key_cache.misses" if item is None else "api_key_cache.hits")
+    return item
+
+
+def write(key_hash: str, api_key_id: int, principal: Principal) -> None:
+    api_key_cache.set(key_hash, (api_key_id, principal))
+
+
+def invalidate(key_hash: str) -> None:
+    api_key_cache.delete(key_hash)
+
+
+def mark_used(api_key_id: int) -> None:
+    _last_used[api_key_id] = datetime.now()
+
+
+def pop_last_used() -> dict[int, datetime]:
+    global _last_used
+
+    last_used, _last_used = _last_used, {}
+    return last_used
+
+
+def restore_last_used(last_used: dict[int, datetime]) -> None:
+    """Puts back usage which was not written, usage since the pop is newer"""
+    for api_key_id, used_at in last_used.items():
+        _last_used.setdefault(api_key_id, used_at)
@@ -0,0 +1,135 @@
+import json
+from abc import ABC, abstractmethod
+from logging import getLogger
+from typing import Any, Iterable
+
+import redis.asyncio as redis
+
+import metrics
+from cache.lru_cache import TTLLRUCache
+from configs import app_config
+
+logger = getLogger("main.feed_cache")
+
+
+class FeedCache(ABC):
+    """
+    Cache of feed responses. Every user has a version which is a part of the
+    cache key, so invalidation of the user's feed is a version increment.
+    """
+
+    @abstractmethod
+    async def make_key(self, user_id: int, params: str) -> str:
+        """Builds the key from the current version of the user's feed"""
+
+    @abstractmethod
+    async def get(self, key: str) -> dict[str, Any] | None:
+        pass
+
+    @abstractmethod
+    async def set(self, key: str, value: dict[str, Any]) -> None:
+        pass
+
+    @abstractmethod
+    async def invalidate(self, user_ids: Iterable[int]) -> None:
+        pass
+
+
+class MemoryFeedCache(FeedCache):
+    """Cache of the current worker, suitable for a single worker only"""
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self._responses = TTLLRUCache(max_size=max_size, ttl=ttl)
+        self._versions: dict[int, int] = {}
+
+    async def make_key(self, user_id: int, params: str) -> str:
+        return "{}:{}:{}".format(user_id, self._versions.get(user_id, 0), params)
+
+    async def get(self, key: str) -> dict[str, Any] | None:
+        return self._responses.get(key)
+
+    async def set(self, key: str, value: dict[str, Any]) -> None:
+        self._responses.set(key, value)
+
+    async def invalidate(self, user_ids: Iterable[int]) -> None:
+        for user_id in user_ids:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
+
+class RedisFeedCache(FeedCache):
+    """
+    Cache shared by all workers. Eviction of the least recently used keys is up
+    to the redis maxmemory-policy.
+    """
+
+    def __init__(self, url: str, ttl: int) -> None:
+        self._redis = redis.from_url(url)
+        self._ttl = ttl
+
+    async def make_key(self, user_id: int, params: str) -> str:
+        version = await self._redis.get("feed_version:{}".format(user_id))
+        return "feed:{}:{}:{}".format(user_id, int(version or 0), params)
+
+    async def get(self, key: str) -> dict[str, Any] | None:
+        value = await self._redis.get(key)
+        return None if value is None else json.loads(value)
+
+    async def set(self, key: str, value: dict[str, Any]) -> None:
+        await self._redis.set(key, json.dumps(value), ex=self._ttl)
+
+    async def invalidate(self, user_ids: Iterable[int]) -> None:
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.incr("feed_version:{}".format(user_id))
+            await pipe.execute()
+
+
+class NoFeedCache(FeedCache):
+    async def make_key(self, user_id: int, params: str) -> str:
+        return ""
+
+    async def get(self, key: str) -> dict[str, Any] | None:
+        return None
+
+    async def set(self, key: str, value: dict[str, Any]) -> None:
+        pass
+
+    async def invalidate(self, user_ids: Iterable[int]) -> None:
+        pass
+
+
+def create_feed_cache() -> FeedCache:
+    backend = app_config.FEED_CACHE_BACKEND
+    if backend == "memory":
+        return MemoryFeedCache(
+            max_size=app_config.FEED_CACHE_MAX_SIZE, ttl=app_config.FEED_CACHE_TTL
+        )
+    elif backend == "redis":
+        return RedisFeedCache(url=app_config.REDIS_URL, ttl=app_config.FEED_CACHE_TTL)
+    else:
+        logger.info("Feed cache disabled, backend=%s", backend)
+        return NoFeedCache()
+
+
+feed_cache = create_feed_cache()
+
+
+async def make_key(user_id: int, params: str) -> str:
+    return await feed_cache.make_key(user_id=user_id, params=params)
+
+
+async def read(key: str) -> dict[str, Any] | None:
+    value = await feed_cache.get(key)
+    metrics.increment("feed_cache.misses" if value is None else "feed_cache.hits")
+    return value
+
+
+async def write(key: str, value: dict[str, Any]) -> None:
+    await feed_cache.set(key, value)
+
+
+async def invalidate(user_ids: Iterable[int]) -> None:
+    user_ids = list(user_ids)
+    if user_ids:
+        await feed_cache.invalidate(user_ids)
+        metrics.increment("feed_cache.invalidated_feeds", len(user_ids))
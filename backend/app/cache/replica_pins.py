@@ -0,0 +1,79 @@
+"""
+Users who wrote recently, their reads stay on the primary until the replica
+catches up, see db.routing. Pins must be shared by all workers: the next
+request of the user may be served by another one.
+"""
+from abc import ABC, abstractmethod
+from typing import Iterable
+
+import redis.asyncio as redis
+
+from cache.lru_cache import TTLLRUCache
+from configs import app_config
+
+
+class ReplicaPins(ABC):
+    @abstractmethod
+    async def pin(self, user_ids: Iterable[int]) -> None:
+        pass
+
+    @abstractmethod
+    async def is_pinned(self, user_id: int) -> bool:
+        pass
+
+
+class MemoryReplicaPins(ReplicaPins):
+    """Pins of the current worker, suitable for a single worker only"""
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self._pinned_users = TTLLRUCache(max_size=max_size, ttl=ttl)
+
+    async def pin(self, user_ids: Iterable[int]) -> None:
+        for user_id in user_ids:
+            self._pinned_users.set(user_id, True)
+
+    async def is_pinned(self, user_id: int) -> bool:
+        return bool(self._pinned_users.get(user_id))
+
+
+class RedisReplicaPins(ReplicaPins):
+    """Pins shared by all workers, expired by redis"""
+
+    def __init__(self, url: str, ttl: int) -> None:
+        self._redis = redis.from_url(url)
+        self._ttl = ttl
+
+    async def pin(self, user_ids: Iterable[int]) -> None:
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.set("db_pin:{}".format(user_id), 1, ex=self._ttl)
+            await pipe.execute()
+
+    async def is_pinned(self, user_id: int) -> bool:
+        return bool(await self._redis.exists("db_pin:{}".format(user_id)))
+
+
+def create_replica_pins() -> ReplicaPins:
+    backend = app_config.DB_REPLICA_PIN_BACKEND
+    if backend == "memory":
+        return MemoryReplicaPins(
+            max_size=app_config.DB_REPLICA_PIN_MAX_SIZE,
+            ttl=app_config.DB_REPLICA_PIN_TIME,
+        )
+    elif backend == "redis":
+        return RedisReplicaPins(
+            url=app_config.REDIS_URL, ttl=app_config.DB_REPLICA_PIN_TIME
+        )
+    else:
+        raise ValueError("Unknown replica pins backend: {}".format(backend))
+
+
+replica_pins = create_replica_pins()
+
+
+async def pin(user_ids: Iterable[int]) -> None:
+    await replica_pins.pin(user_ids)
+
+
+async def is_pinned(user_id: int) -> bool:
+    return await replica_pins.is_pinned(user_id)
@@ -0,0 +1,48 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+import metrics
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first call does the work,
+    the others wait for its result. If the result is not ready within timeout,
+    waiting call does the work on its own.
+    """
+
+    def __init__(self, timeout: float) -> None:
+        self.timeout = timeout
+        self._calls: dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        in_flight = self._calls.get(key)
+        if in_flight is not None:
+            metrics.increment("single_flight.shared_calls")
+            try:
+                return await asyncio.wait_for(asyncio.shield(in_flight), self.timeout)
+            except asyncio.TimeoutError:
+                metrics.increment("single_flight.timeouts")
+            except asyncio.CancelledError:
+                # the first call was cancelled, not this one
+                if not in_flight.cancelled():
+                    raise
+            return await func()
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # mark exception as retrieved if nobody waits for it
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
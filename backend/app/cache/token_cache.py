@@ -0,0 +1,35 @@
+"""
+Per-worker cache of the principals of the verified JWT access tokens. Entries
+live until the token expires, tokens are keyed by hash.
+"""
+import hashlib
+from time import time
+
+import metrics
+from cache.lru_cache import TTLLRUCache
+from configs import app_config
+from schemas.user_schema import Principal
+
+token_cache = TTLLRUCache(
+    max_size=app_config.TOKEN_CACHE_MAX_SIZE,
+    ttl=app_config.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+)
+
+metrics.register_gauge("token_cache.size", lambda: len(token_cache))
+
+
+def read(token: str) -> Principal | None:
+    principal = token_cache.get(_hash(token))
+    metrics.increment("token_cache.misses" if principal is None else "token_cache.hits")
+    return principal
+
+
+def write(token: str, principal: Principal, expires_at: float | None) -> None:
+    ttl = None if expires_at is None else expires_at - time()
+    if ttl is not None and ttl <= 0:
+        return
+    token_cache.set(_hash(token), principal, ttl=ttl)
+
+
+def _hash(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
@@ -0,0 +1,38 @@
+"""
+Per-worker cache of the authenticated principals by user id. Changes of users
+made by this worker invalidate it, changes made by other workers are seen
+after USER_CACHE_TTL.
+"""
+from sqlalchemy import event
+
+import metrics
+from cache.lru_cache import TTLLRUCache
+from configs import app_config
+from db_models.user_model import User
+from schemas.user_schema import Principal
+
+principal_cache = TTLLRUCache(
+    max_size=app_config.USER_CACHE_MAX_SIZE, ttl=app_config.USER_CACHE_TTL
+)
+
+metrics.register_gauge("user_cache.size", lambda: len(principal_cache))
+
+
+def read(user_id: int) -> Principal | None:
+    principal = principal_cache.get(user_id)
+    metrics.increment("user_cache.misses" if principal is None else "user_cache.hits")
+    return principal
+
+
+def write(principal: Principal) -> None:
+    principal_cache.set(principal.user_id, principal)
+
+
+def invalidate(user_id: int) -> None:
+    principal_cache.delete(user_id)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def invalidate_changed_user(_, __, target: User) -> None:
+    invalidate(target.user_id)
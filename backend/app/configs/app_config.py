@@ -16,20 +16,132 @@ DB_USER = os.environ.get("DB_USER")
 DB_PASSWORD = os.environ.get("DB_PASSWORD")
 DB_HOST = os.environ.get("DB_HOST")
 
+# connection pool of every worker process, so Postgres max_connections must
+# exceed workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW)
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 20))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+DB_POOL_RECYCLE = 1800  # seconds, -1 to keep connections forever
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "true") == "true"
+DB_POOL_TIMEOUT = 30  # seconds to wait for a free connection
+DB_STATEMENT_TIMEOUT = int(os.environ.get("DB_STATEMENT_TIMEOUT", 30000))  # ms
+# compiled statements of the engine, shared by all connections
+DB_QUERY_CACHE_SIZE = 1200
+# prepared statements of every connection, hot queries must not be evicted
+DB_PREPARED_STATEMENT_CACHE_SIZE = 500
+
+# streaming replica for read functions, all queries go to the primary if unset
+DB_REPLICA_HOST = os.environ.get("DB_REPLICA_HOST")
+DB_REPLICA_PIN_TIME = 5  # seconds of reading own writes from the primary
+# store of the pins. One of ["memory", "redis"], memory is per worker
+DB_REPLICA_PIN_BACKEND = os.environ.get("DB_REPLICA_PIN_BACKEND", "memory")
+DB_REPLICA_PIN_MAX_SIZE = 10000
+
 # Authentication configuration. One of ["API-KEY", "JWT"]
 AUTH_CONFIG = "API-KEY"
 
+# api keys are stored hashed, see crud_api_key. The legacy key "test" of the
+# user 1 is used by the demo frontend only, it is off unless enabled.
+LEGACY_API_KEYS = os.environ.get("LEGACY_API_KEYS") == "true"
+API_KEY_CACHE_TTL = 60  # seconds
+API_KEY_CACHE_MAX_SIZE = 10000
+API_KEY_LAST_USED_INTERVAL = 60  # seconds between write backs of last usage
+
 # for JWT authentication
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 15
 
+# threads hashing passwords, also the limit of hashes computed at a time
+PASSWORD_HASH_WORKERS = 2
+# verified tokens cached per worker, see cache.token_cache
+TOKEN_CACHE_MAX_SIZE = 10000
+
+# per-worker cache of the authenticated users
+USER_CACHE_TTL = 60  # seconds
+USER_CACHE_MAX_SIZE = 10000
+
 # максимальный размер изображения в байтах, 1Мб = 1048576
-MAX_IMG_SIZE = 1048576
+MAX_IMG_SIZE = int(os.environ.get("MAX_IMG_SIZE", 1048576))
+
+# latest entries kept in every home timeline, the feed ranks tweets among them
+TIMELINE_MAX_SIZE = 1000
+# timelines over the size are trimmed in the background
+TIMELINE_TRIM_INTERVAL = 300  # seconds
+TIMELINE_TRIM_BATCH_SIZE = 1000  # users
+# how many latest tweets of an author are copied to the home timeline on follow
+TIMELINE_BACKFILL_SIZE = 1000
+
+# tweets of authors with more followers are not pushed to the timelines,
+# they are pulled and merged into the feed at read time
+FEED_PULL_FOLLOWERS_THRESHOLD = int(
+    os.environ.get("FEED_PULL_FOLLOWERS_THRESHOLD", 5000)
+)
+
+# how many recent likers of each tweet are returned with the feed
+FEED_LIKES_PREVIEW_SIZE = 10
+
+# feed response cache. One of ["memory", "redis", "none"]. Memory backend is
+# invalidated only in its own worker, use redis with several workers.
+FEED_CACHE_BACKEND = os.environ.get("FEED_CACHE_BACKEND", "memory")
+FEED_CACHE_TTL = 10  # seconds
+FEED_CACHE_MAX_SIZE = 10000
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+
+# how long concurrent identical reads wait for the query already in flight
+SINGLE_FLIGHT_TIMEOUT = 5  # seconds
+
+# background reconciliation of the denormalized tweet like counters
+LIKE_RECONCILE_INTERVAL = 600  # seconds
+LIKE_RECONCILE_BATCH_SIZE = 10000
+
+# push of the new feed items, limits are per worker
+STREAM_MAX_CONNECTIONS = int(os.environ.get("STREAM_MAX_CONNECTIONS", 1000))
+STREAM_QUEUE_SIZE = 100  # events queued per connection before resync
+STREAM_KEEPALIVE_INTERVAL = 15  # seconds
 
 # main.py directory
 BASE_DIR = Path(__file__).resolve().parents[1]
 
 MEDIA_ROOT = BASE_DIR.parents[1] / "static"
 
+# uploads are streamed here, it must be on the same filesystem as MEDIA_ROOT
+# to be moved into it atomically
+UPLOAD_TMP_DIR = MEDIA_ROOT / ".uploads"
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# threads of the media filesystem operations, see storage.fs
+MEDIA_FS_WORKERS = 8
+
+# media storage. One of ["local", "s3"]. Local storage is MEDIA_ROOT, it must
+# be shared by all the app containers.
+MEDIA_STORAGE_BACKEND = os.environ.get("MEDIA_STORAGE_BACKEND", "local")
+# S3 compatible storage, e.g. MinIO. S3_ENDPOINT_URL=None for AWS.
+S3_ENDPOINT_URL = os.environ.get("S3_ENDPOINT_URL")
+S3_REGION = os.environ.get("S3_REGION", "us-east-1")
+S3_BUCKET = os.environ.get("S3_BUCKET", "media")
+S3_ACCESS_KEY = os.environ.get("S3_ACCESS_KEY")
+S3_SECRET_KEY = os.environ.get("S3_SECRET_KEY")
+# base URL of the bucket for the clients
+S3_PUBLIC_URL = os.environ.get("S3_PUBLIC_URL", "http://localhost:9000/media")
+# larger files are uploaded in parts. S3 parts are at least 5 MiB except the
+# last one, so it pays off only when MAX_IMG_SIZE is raised above the threshold
+S3_MULTIPART_THRESHOLD = int(os.environ.get("S3_MULTIPART_THRESHOLD", 8 * 1024 * 1024))
+S3_PART_SIZE = int(os.environ.get("S3_PART_SIZE", 8 * 1024 * 1024))
+S3_MAX_CONCURRENCY = 4  # parts uploaded at a time
+
+# resized variants of the uploaded images, generated in a process pool.
+# Maximum widths by variant name, the feed returns MEDIA_FEED_VARIANT.
+MEDIA_VARIANT_WIDTHS = {"thumbnail": 320, "feed": 1080}
+MEDIA_FEED_VARIANT = "feed"
+MEDIA_VARIANT_FORMAT = "WEBP"
+MEDIA_VARIANT_QUALITY = 80
+IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS", 2))
+
+# background removal of the media never attached to a tweet. With dry run
+# orphans are only counted and logged.
+MEDIA_GC_INTERVAL = 3600  # seconds
+MEDIA_GC_GRACE_PERIOD = 24 * 3600  # seconds since upload
+MEDIA_GC_BATCH_SIZE = 500
+MEDIA_GC_DRY_RUN = os.environ.get("MEDIA_GC_DRY_RUN") == "true"
+
 TEST_MEDIA_ROOT = BASE_DIR / "tests"
@@ -0,0 +1,105 @@
+import hashlib
+import hmac
+import secrets
+from datetime import datetime
+from typing import Sequence
+
+from sqlalchemy import DateTime, Integer, column, update, values
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from db_models.api_key_model import ApiKey
+from db_models.user_model import User
+
+HASH_PREFIX_LENGTH = 16
+
+
+def hash_key(key: str) -> str:
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+async def create_api_key(
+    session: AsyncSession, user_id: int, name: str | None = None
+) -> tuple[ApiKey, str]:
+    """:return: the new key and its plain text, which is not stored"""
+    key = secrets.token_urlsafe(32)
+    key_hash = hash_key(key)
+    api_key = ApiKey(
+        user_id=user_id,
+        name=name,
+        hash_prefix=key_hash[:HASH_PREFIX_LENGTH],
+        key_hash=key_hash,
+    )
+
+    async with session.begin():
+        session.add(api_key)
+
+    return api_key, key
+
+
+async def read_api_keys(session: AsyncSession, user_id: int) -> Sequence[ApiKey]:
+    statement = (
+        select(ApiKey).where(ApiKey.user_id == user_id).order_by(ApiKey.api_key_id)
+    )
+
+    async with session.begin():
+        api_keys = await session.scalars(statement)
+    return api_keys.all()
+
+
+async def read_user_by_key_hash(
+    session: AsyncSession, key_hash: str
+) -> tuple[int, User] | None:
+    """:return: id of the active api key and its user"""
+    statement = (
+        select(ApiKey.api_key_id, ApiKey.key_hash, User)
+        .join(User, User.user_id == ApiKey.user_id)
+        .where(
+            ApiKey.hash_prefix == key_hash[:HASH_PREFIX_LENGTH],
+            ApiKey.revoked_at.is_(None),
+        )
+    )
+
+    async with session.begin():
+        rows = (await session.execute(statement)).all()
+
+    for api_key_id, stored_hash, user in rows:
+        if hmac.compare_digest(stored_hash, key_hash):
+            return api_key_id, user
+    return None
+
+
+async def revoke_api_key(
+    session: AsyncSession, user_id: int, api_key_id: int
+) -> str | None:
+    """:return: hash of the revoked key, None if there is no such active key"""
+    statement = (
+        update(ApiKey)
+        .where(
+            ApiKey.api_key_id == api_key_id,
+            ApiKey.user_id == user_id,
+            ApiKey.revoked_at.is_(None),
+        )
+        .values(revoked_at=datetime.now())
+        .returning(ApiKey.key_hash)
+    )
+
+    async with session.begin():
+        result = await session.execute(statement)
+    return result.scalar_one_or_none()
+
+
+async def update_last_used(
+    session: AsyncSession, last_used: dict[int, datetime]
+) -> None:
+    """Writes last used timestamps of many keys with one statement"""
+    last_used_values = values(
+        column("api_key_id", Integer), column("last_used_at", DateTime), name="used"
+    ).data(list(last_used.items()))
+
+    async with session.begin():
+        await session.execute(
+            update(ApiKey)
+            .where(ApiKey.api_key_id == last_used_values.c.api_key_id)
+            .values(last_used_at=last_used_values.c.last_used_at)
+        )
@@ -1,43 +1,217 @@
 import os
+from collections import Counter
 from datetime import datetime
+from functools import partial
 from logging import getLogger
 from typing import Any
+from uuid import uuid4
 
-import aiofiles
+from sqlalchemy import (
+    Integer,
+    Row,
+    String,
+    column,
+    delete,
+    exists,
+    literal_column,
+    select,
+    update,
+    values,
+)
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from configs import app_config
+import metrics
+from db.session import async_session
+from db_models.media_blob_model import MediaBlob
 from db_models.media_model import Media
+from db_models.tweet_media_relation import tweet_media_relationship
+from image_processing import pool
+from storage import media_storage
 
 logger = getLogger("main.crud_media")
 
 
+def blob_link(blob_hash: str, filename: str) -> str:
+    """
+    Sharded path of the blob, e.g. images/ab/cd/abcd...ef-1a2b3c4d.png
+    Every stored copy gets its own generation suffix, so deletion of a
+    released blob pending after commit never removes the file of the same
+    content uploaded again in the meantime.
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    return "images/{}/{}/{}-{}{}".format(
+        blob_hash[:2], blob_hash[2:4], blob_hash, uuid4().hex[:8], extension
+    )
+
+
 async def create_media(
     session: AsyncSession,
     file_data: dict[str, Any],
     user_id: int,
 ) -> Media:
-    link = "images/{user}/".format(user=user_id)
+    """
+    Stores uploaded file by its content hash. When the same content is already
+    stored only the reference count of the blob is incremented. New content is
+    uploaded to a link nobody references yet, before any transaction, so no
+    connection is held during the upload.
+    """
+    blob_hash = file_data["sha256"]
+
+    async with session.begin():
+        blob = (
+            await session.execute(
+                update(MediaBlob)
+                .where(MediaBlob.hash == blob_hash)
+                .values(ref_count=MediaBlob.ref_count + 1)
+                .returning(MediaBlob.link, MediaBlob.variants)
+            )
+        ).one_or_none()
+        if blob is not None:
+            metrics.increment("media.deduplicated_bytes", file_data["size"])
+            return _add_media(session, blob, user_id, blob_hash)
+
+    link = blob_link(blob_hash, file_data["filename"])
+    await media_storage.save(file_data["path"], link)
+    logger.debug("Stored blob: %s", link)
 
-    if not os.path.exists(app_config.MEDIA_ROOT / link):
-        os.mkdir(app_config.MEDIA_ROOT / link)
-        logger.debug("Created path: %s", app_config.MEDIA_ROOT / link)
+    try:
+        async with session.begin():
+            # row lock of the upsert serializes concurrent uploads of the same
+            # content, xmax = 0 only for the newly inserted row. Core insert,
+            # the ORM one can't return a literal column with on conflict.
+            blobs = MediaBlob.__table__
+            statement = (
+                insert(blobs)
+                .values(hash=blob_hash, link=link, size=file_data["size"], ref_count=1)
+                .on_conflict_do_update(
+                    index_elements=[blobs.c.hash],
+                    set_={"ref_count": blobs.c.ref_count + 1},
+                )
+                .returning(
+                    blobs.c.link,
+                    blobs.c.variants,
+                    literal_column("xmax = 0").label("inserted"),
+                )
+            )
+            blob = (await session.execute(statement)).one()
+            media = _add_media(session, blob, user_id, blob_hash)
+    except BaseException:
+        media_storage.delete_later([link])
+        raise
 
-    timestamp = datetime.timestamp(datetime.now())
+    if blob.inserted:
+        pool.enqueue_variants(
+            link=blob.link, on_ready=partial(_save_variants, blob_hash)
+        )
+    else:
+        # concurrent upload of the same content won, our copy is not referenced
+        media_storage.delete_later([link])
+        metrics.increment("media.deduplicated_bytes", file_data["size"])
 
-    new_filename = "{:.4f}_{}".format(timestamp, file_data["filename"])
+    return media
 
-    link = "".join([link, new_filename])
 
-    async with aiofiles.open(
-        file=app_config.MEDIA_ROOT / link,
-        mode="wb",
-    ) as file_to_write:
-        await file_to_write.write(file_data["content"])
+def _add_media(session: AsyncSession, blob: Row, user_id: int, blob_hash: str) -> Media:
+    media = Media(
+        link=blob.link,
+        owner_id=user_id,
+        blob_hash=blob_hash,
+        variants=blob.variants,
+    )
+    session.add(media)
+    return media
 
-    media = Media(link=link)
 
+async def set_variants(
+    session: AsyncSession, blob_hash: str, variants: dict[str, str]
+) -> None:
+    """
+    Saves variants of the blob and copies them to its media. The blob row is
+    locked first, so media created concurrently gets the variants from it.
+    """
     async with session.begin():
-        session.add(media)
+        await session.execute(
+            update(MediaBlob)
+            .where(MediaBlob.hash == blob_hash)
+            .values(variants=variants)
+        )
+        await session.execute(
+            update(Media).where(Media.blob_hash == blob_hash).values(variants=variants)
+        )
 
-    return media
+
+async def delete_orphaned_media(
+    session: AsyncSession,
+    created_before: datetime,
+    limit: int,
+    after_id: int = 0,
+    dry_run: bool = False,
+) -> tuple[list[int], list[str]]:
+    """
+    Deletes a batch of media not attached to any tweet. Rows are deleted
+    without the ORM, so files are not touched inside the flush.
+    With dry_run the transaction is rolled back.
+
+    :param after_id: keyset, media id of the previous batch.
+    :return: ids of the deleted media, links of the files nobody references.
+    """
+    orphan_ids = (
+        select(Media.media_id)
+        .where(
+            Media.media_id > after_id,
+            Media.created_at < created_before,
+            ~exists().where(tweet_media_relationship.c.media_id == Media.media_id),
+        )
+        .order_by(Media.media_id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+
+    async with session.begin() as transaction:
+        deleted = (
+            await session.execute(
+                delete(Media)
+                .where(Media.media_id.in_(orphan_ids.scalar_subquery()))
+                .returning(Media.media_id, Media.link, Media.blob_hash)
+            )
+        ).all()
+
+        # media uploaded before content addressed storage owns its file
+        links = [row.link for row in deleted if row.blob_hash is None]
+        released = Counter(row.blob_hash for row in deleted if row.blob_hash)
+        if released:
+            links.extend(await _release_blobs(session=session, released=released))
+
+        if dry_run:
+            await transaction.rollback()
+
+    return [row.media_id for row in deleted], links
+
+
+async def _release_blobs(session: AsyncSession, released: Counter[str]) -> list[str]:
+    """Decrements reference counts, deletes unreferenced blobs"""
+    released_values = values(
+        column("hash", String), column("count", Integer), name="released"
+    ).data(list(released.items()))
+    await session.execute(
+        update(MediaBlob)
+        .where(MediaBlob.hash == released_values.c.hash)
+        .values(ref_count=MediaBlob.ref_count - released_values.c.count)
+    )
+    unreferenced = await session.execute(
+        delete(MediaBlob)
+        .where(MediaBlob.hash.in_(released), MediaBlob.ref_count <= 0)
+        .returning(MediaBlob.link, MediaBlob.variants)
+    )
+
+    links = []
+    for link, variants in unreferenced:
+        links.append(link)
+        links.extend(variants.values())
+    return links
+
+
+async def _save_variants(blob_hash: str, variants: dict[str, str]) -> None:
+    async with async_session() as session:
+        await set_variants(session=session, blob_hash=blob_hash, variants=variants)
@@ -0,0 +1,181 @@
+from typing import cast
+
+from sqlalchemy import (
+    ColumnElement,
+    CursorResult,
+    Select,
+    delete,
+    literal,
+    union_all,
+)
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import InstrumentedAttribute, aliased
+
+from configs import app_config
+from db_models.follower_model import Follower
+from db_models.timeline_model import TimelineEntry
+from db_models.tweet_model import Tweet
+from db_models.user_model import User
+
+TIMELINE_COLUMNS = ["user_id", "tweet_id", "author_id"]
+
+
+async def is_pull_author(session: AsyncSession, author_id: int) -> bool:
+    """Checks if author has too many followers to push tweets to timelines"""
+    follower_count = await session.scalar(
+        select(User.follower_count).where(User.user_id == author_id)
+    )
+    return (follower_count or 0) > app_config.FEED_PULL_FOLLOWERS_THRESHOLD
+
+
+async def fan_out_tweet(session: AsyncSession, tweet: Tweet) -> list[int]:
+    """
+    Appends new tweet to the timeline of every follower of its author.
+
+    :return: ids of the followers.
+    """
+    inserted = await session.scalars(
+        insert(TimelineEntry)
+        .from_select(
+            TIMELINE_COLUMNS,
+            select(
+                Follower.follower_id,
+                literal(tweet.tweet_id),
+                literal(tweet.author_id),
+            ).where(Follower.user_id == tweet.author_id),
+        )
+        .returning(TimelineEntry.user_id)
+    )
+    return list(inserted.all())
+
+
+async def backfill_timeline(
+    session: AsyncSession, user_id: int, author_id: int
+) -> None:
+    """Copies the latest tweets of the followed author to the user's timeline"""
+    await session.execute(
+        insert(TimelineEntry)
+        .from_select(
+            TIMELINE_COLUMNS,
+            select(literal(user_id), Tweet.tweet_id, Tweet.author_id)
+            .where(Tweet.author_id == author_id, Tweet.fanned_out)
+            .order_by(Tweet.tweet_id.desc())
+            .limit(app_config.TIMELINE_BACKFILL_SIZE),
+        )
+        .on_conflict_do_nothing()
+    )
+
+
+async def trim_timelines(
+    session: AsyncSession, after_user_id: int, limit: int
+) -> tuple[int | None, int]:
+    """
+    Deletes entries older than TIMELINE_MAX_SIZE latest ones from the timelines
+    of the next limit users after after_user_id. Only timelines with an entry
+    past the cap are trimmed, both probes read the primary key backwards.
+
+    :return: id of the last checked user, None when no users are left,
+    and the number of deleted entries.
+    """
+    async with session.begin():
+        user_ids = await session.scalars(
+            select(User.user_id)
+            .where(User.user_id > after_user_id)
+            .order_by(User.user_id)
+            .limit(limit)
+        )
+        batch = user_ids.all()
+        if not batch:
+            return None, 0
+
+        owners = (
+            select(User.user_id)
+            .where(
+                User.user_id.between(batch[0], batch[-1]),
+                _nth_latest_entry(User.user_id, app_config.TIMELINE_MAX_SIZE).exists(),
+            )
+            .subquery("owners")
+        )
+        oldest_kept_id = _nth_latest_entry(
+            owners.c.user_id, app_config.TIMELINE_MAX_SIZE - 1
+        ).scalar_subquery()
+        boundaries = select(
+            owners.c.user_id, oldest_kept_id.label("tweet_id")
+        ).subquery("boundaries")
+
+        result = await session.execute(
+            delete(TimelineEntry)
+            .where(
+                TimelineEntry.user_id == boundaries.c.user_id,
+                TimelineEntry.tweet_id < boundaries.c.tweet_id,
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+    return batch[-1], cast(CursorResult, result).rowcount
+
+
+def _nth_latest_entry(
+    user_id: ColumnElement[int] | InstrumentedAttribute[int], offset: int
+) -> Select:
+    """Tweet id of the timeline entry at offset, counting from the latest one"""
+    entry = aliased(TimelineEntry)
+    return (
+        select(entry.tweet_id)
+        .where(entry.user_id == user_id)
+        .order_by(entry.tweet_id.desc())
+        .offset(offset)
+        .limit(1)
+    )
+
+
+async def prune_timeline(session: AsyncSession, user_id: int, author_id: int) -> None:
+    """Removes all tweets of the unfollowed author from the user's timeline"""
+    await session.execute(
+        delete(TimelineEntry)
+        .where(TimelineEntry.user_id == user_id)
+        .where(TimelineEntry.author_id == author_id)
+    )
+
+
+async def read_follower_ids(session: AsyncSession, author_id: int) -> list[int]:
+    """Reads ids of the followers, they read pulled tweets of the author"""
+    user_ids = await session.scalars(
+        select(Follower.follower_id).where(Follower.user_id == author_id)
+    )
+    return list(user_ids.all())
+
+
+async def read_feed_readers(session: AsyncSession, tweet_id: int) -> list[int]:
+    """
+    Reads ids of the users who have the tweet in their feeds: owners of the
+    timelines with the tweet, or followers of the author for a pulled tweet.
+    """
+    timeline_owners = select(TimelineEntry.user_id).where(
+        TimelineEntry.tweet_id == tweet_id
+    )
+    pulling_followers = (
+        select(Follower.follower_id)
+        .join(Tweet, Tweet.author_id == Follower.user_id)
+        .where(Tweet.tweet_id == tweet_id, ~Tweet.fanned_out)
+    )
+    user_ids = await session.scalars(union_all(timeline_owners, pulling_followers))
+    return list(user_ids.all())
+
+
+async def remove_tweet_from_timelines(
+    session: AsyncSession, tweet_id: int
+) -> list[int]:
+    """
+    Removes the tweet from all timelines.
+
+    :return: ids of the users who had the tweet in their timelines.
+    """
+    user_ids = await session.scalars(
+        delete(TimelineEntry)
+        .where(TimelineEntry.tweet_id == tweet_id)
+        .returning(TimelineEntry.user_id)
+    )
+    return list(user_ids.all())
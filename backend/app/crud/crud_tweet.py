@@ -1,17 +1,53 @@
-from typing import Sequence
+import heapq
+from itertools import chain, islice
+from operator import attrgetter
+from typing import Literal, Sequence, cast
 
-from sqlalchemy import desc, func
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import (
+    ColumnElement,
+    CursorResult,
+    Integer,
+    ScalarSelect,
+    Select,
+    any_,
+    bindparam,
+    delete,
+    desc,
+    func,
+    insert,
+    true,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.orm import aliased, contains_eager, joinedload, selectinload
+from sqlalchemy.orm import aliased, joinedload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 
+import metrics
+from cache import feed_cache
+from configs import app_config
+from crud import crud_timeline
+from crud.utils import coalesce_calls
+from custom_exc.no_media_found import NoMediaFoundError
+from db import routing
 from db_models.follower_model import Follower
 from db_models.like_model import Like
 from db_models.media_model import Media
+from db_models.timeline_model import TimelineEntry
+from db_models.tweet_media_relation import tweet_media_relationship
 from db_models.tweet_model import Tweet
 from db_models.user_model import User
+from feed_stream import events
 from schemas.tweet_schema import CreateTweetModelIn
 
+LIKE_RECONCILE_LOCK_ID = 7001
+
+metrics.register_gauge(
+    "feed.pull_followers_threshold", lambda: app_config.FEED_PULL_FOLLOWERS_THRESHOLD
+)
+
 
 async def create_tweet(
     session: AsyncSession, tweet_data: CreateTweetModelIn, author: int | User
@@ -27,70 +63,383 @@ async def create_tweet(
     else:
         raise TypeError
 
+    # duplicates are dropped, order is kept
+    tweet_media_ids = list(dict.fromkeys(tweet_media_ids))
+
     async with session.begin():
         if tweet_media_ids:
-            for media_id in tweet_media_ids:
-                media = await session.get(Media, media_id)
-                if media:
-                    tweet.attachments.append(media)
+            await _check_media_owner(
+                session=session, media_ids=tweet_media_ids, owner_id=tweet.author_id
+            )
+        tweet.fanned_out = not await crud_timeline.is_pull_author(
+            session=session, author_id=tweet.author_id
+        )
         session.add(tweet)
+        await session.flush()
+        if tweet_media_ids:
+            await session.execute(
+                insert(tweet_media_relationship).values(
+                    [
+                        {"tweet_id": tweet.tweet_id, "media_id": media_id}
+                        for media_id in tweet_media_ids
+                    ]
+                )
+            )
+        if tweet.fanned_out:
+            follower_ids = await crud_timeline.fan_out_tweet(
+                session=session, tweet=tweet
+            )
+        else:
+            follower_ids = await crud_timeline.read_follower_ids(
+                session=session, author_id=tweet.author_id
+            )
+        await events.publish(
+            session=session,
+            event={
+                "type": "tweet",
+                "tweet_id": tweet.tweet_id,
+                "author_id": tweet.author_id,
+            },
+        )
+
+    await feed_cache.invalidate(follower_ids)
+    await routing.pin_to_primary([tweet.author_id])
 
     return tweet
 
 
+async def _check_media_owner(
+    session: AsyncSession, media_ids: list[int], owner_id: int
+) -> None:
+    """Raises NoMediaFoundError when some media is missing or not owned"""
+    # shared lock keeps the media from the orphaned media collector
+    found_ids = await session.scalars(
+        select(Media.media_id)
+        .where(Media.media_id.in_(media_ids), Media.owner_id == owner_id)
+        .with_for_update(read=True)
+    )
+    missing_ids = set(media_ids).difference(found_ids)
+    if missing_ids:
+        raise NoMediaFoundError(sorted(missing_ids))
+
+
+# Statements of the feed are built once, so the cache key and the compiled
+# form are reused and every call only binds parameters. Lists of ids are bound
+# as arrays, then one prepared statement serves any number of tweets.
+
+
+def _timeline_tweet_ids(since: bool = False) -> Select:
+    """Latest entries of the timeline, a range of its primary key"""
+    statement = (
+        select(TimelineEntry.tweet_id)
+        .where(TimelineEntry.user_id == bindparam("user_id"))
+        .order_by(desc(TimelineEntry.tweet_id))
+        .limit(app_config.TIMELINE_MAX_SIZE)
+    )
+    if since:
+        statement = statement.where(TimelineEntry.tweet_id > bindparam("since_id"))
+    return statement
+
+
+def _pulled_tweets_clause(since: bool = False) -> ColumnElement[bool]:
+    """
+    Tweets of followed authors which were not pushed to the timelines, the
+    latest TIMELINE_MAX_SIZE of each author like in a pushed timeline
+    """
+    followed = (
+        select(Follower.user_id)
+        .where(Follower.follower_id == bindparam("user_id", type_=Integer))
+        .subquery("followed")
+    )
+    pulled = aliased(Tweet)
+    latest = (
+        select(pulled.tweet_id)
+        .where(pulled.author_id == followed.c.user_id, ~pulled.fanned_out)
+        .order_by(desc(pulled.tweet_id))
+        .limit(app_config.TIMELINE_MAX_SIZE)
+    )
+    if since:
+        latest = latest.where(pulled.tweet_id > bindparam("since_id"))
+    latest_tweets = latest.lateral("latest_tweets")
+    return Tweet.tweet_id.in_(
+        select(latest_tweets.c.tweet_id)
+        .select_from(followed)
+        .join(latest_tweets, true())
+    )
+
+
+def _tweets_statement(where_clause: ColumnElement[bool], *order_by) -> Select:
+    return (
+        select(Tweet)
+        .where(where_clause)
+        .options(
+            joinedload(Tweet.author),
+            selectinload(Tweet.attachments),
+        )
+        .order_by(*order_by)
+        .limit(bindparam("limit", type_=Integer))
+    )
+
+
+def _count_statement(statement: Select) -> ScalarSelect:
+    return (
+        select(func.count())
+        .select_from(statement.limit(bindparam("limit", type_=Integer)).subquery())
+        .scalar_subquery()
+    )
+
+
+FEED_SOURCES = {
+    "pushed": Tweet.tweet_id.in_(_timeline_tweet_ids()),
+    "pulled": _pulled_tweets_clause(),
+}
+NEW_TWEETS_SOURCES = {
+    "pushed": Tweet.tweet_id.in_(_timeline_tweet_ids(since=True)),
+    "pulled": _pulled_tweets_clause(since=True),
+}
+AFTER_RANK_CLAUSE = tuple_(Tweet.like_count, Tweet.tweet_id) < tuple_(
+    bindparam("after_like_count", type_=Integer),
+    bindparam("after_tweet_id", type_=Integer),
+)
+
+RANKED_TWEETS_STATEMENTS = {
+    source: _tweets_statement(
+        where_clause, desc(Tweet.like_count), desc(Tweet.tweet_id)
+    )
+    for source, where_clause in FEED_SOURCES.items()
+}
+RANKED_TWEETS_AFTER_STATEMENTS = {
+    source: statement.where(AFTER_RANK_CLAUSE)
+    for source, statement in RANKED_TWEETS_STATEMENTS.items()
+}
+LATEST_TWEETS_STATEMENTS = {
+    source: _tweets_statement(where_clause, desc(Tweet.tweet_id))
+    for source, where_clause in NEW_TWEETS_SOURCES.items()
+}
+COUNT_NEW_TWEETS_STATEMENT = select(
+    _count_statement(_timeline_tweet_ids(since=True))
+    + _count_statement(select(Tweet.tweet_id).where(NEW_TWEETS_SOURCES["pulled"]))
+)
+
+TWEET_IDS_PARAM = bindparam("tweet_ids", type_=ARRAY(Integer))
+_recent_likes = (
+    select(Like)
+    .where(Like.tweet_id == Tweet.tweet_id)
+    .order_by(desc(Like.created_at))
+    .limit(bindparam("preview_size", type_=Integer))
+    .lateral()
+)
+# lateral is a valid alias, the stubs accept only subqueries and aliases
+_recent_like = aliased(Like, _recent_likes)  # type: ignore[call-overload]
+VIEWER_LIKES_STATEMENT = (
+    select(Like)
+    .where(
+        Like.user_id == bindparam("viewer_id"), Like.tweet_id == any_(TWEET_IDS_PARAM)
+    )
+    .options(joinedload(Like.user))
+)
+PREVIEW_LIKES_STATEMENT = (
+    select(_recent_like)
+    .select_from(Tweet)
+    .join(_recent_likes, true())
+    .where(Tweet.tweet_id == any_(TWEET_IDS_PARAM))
+    .options(joinedload(_recent_like.user))
+)
+
+
+@coalesce_calls
+@routing.replica_read
 async def read_feed(
     session: AsyncSession,
     user_id: int,
     offset=0,
     limit=100,
+    after: tuple[int, int] | None = None,
 ) -> Sequence[Tweet]:
-    sub_query = select(Follower.user_id).where(Follower.follower_id == user_id)
-    following_query = select(User.user_id).where(User.user_id.in_(sub_query))
+    """
+    Merges tweets pushed to the user's timeline with tweets pulled from followed
+    authors who had too many followers for fan-out.
 
-    aliased_likes = aliased(Like)
+    :param after: keyset cursor, (like count, tweet id) of the last seen tweet.
+    """
+    if after is not None:
+        offset = 0
+    window = offset + limit
 
-    tweets = await session.scalars(
-        select(
-            Tweet,
-            func.count(Tweet.likes.of_type(aliased_likes))
-            .over(partition_by=Tweet.tweet_id)
-            .label("like_count"),
+    async with session.begin():
+        pushed_tweets = await _read_ranked_tweets(
+            session=session, source="pushed", user_id=user_id, limit=window, after=after
         )
-        .where(Tweet.author_id.in_(following_query))
-        .outerjoin(Tweet.likes.of_type(aliased_likes))
-        .options(
-            contains_eager(Tweet.likes.of_type(aliased_likes)).joinedload(
-                aliased_likes.user
-            ),
-            joinedload(Tweet.author),
-            selectinload(Tweet.attachments),
+        pulled_tweets = await _read_ranked_tweets(
+            session=session, source="pulled", user_id=user_id, limit=window, after=after
+        )
+
+        with metrics.timer("feed.merge_seconds"):
+            merged = heapq.merge(
+                pushed_tweets, pulled_tweets, key=feed_rank, reverse=True
+            )
+            feed = list(islice(merged, offset, window))
+        metrics.observe("feed.pulled_tweets", len(pulled_tweets))
+
+        await _load_likes_preview(session=session, tweets=feed, viewer_id=user_id)
+
+    return feed
+
+
+async def read_new_tweets(
+    session: AsyncSession,
+    user_id: int,
+    since_id: int,
+    limit=100,
+) -> Sequence[Tweet]:
+    """Reads tweets of the feed newer than since_id, from newest to oldest"""
+    params = {"user_id": user_id, "since_id": since_id, "limit": limit}
+
+    async with session.begin():
+        pushed_tweets = await session.scalars(
+            LATEST_TWEETS_STATEMENTS["pushed"], params
+        )
+        pulled_tweets = await session.scalars(
+            LATEST_TWEETS_STATEMENTS["pulled"], params
         )
-        .order_by(desc("like_count"))
-        .order_by(desc(Tweet.tweet_id))
+        merged = heapq.merge(
+            pushed_tweets.all(),
+            pulled_tweets.all(),
+            key=attrgetter("tweet_id"),
+            reverse=True,
+        )
+        tweets = list(islice(merged, limit))
+
+        await _load_likes_preview(session=session, tweets=tweets, viewer_id=user_id)
+
+    return tweets
+
+
+async def count_new_tweets(
+    session: AsyncSession,
+    user_id: int,
+    since_id: int,
+    limit=100,
+) -> int:
+    """Counts tweets of the feed newer than since_id, up to limit"""
+    async with session.begin():
+        count = await session.scalar(
+            COUNT_NEW_TWEETS_STATEMENT,
+            {"user_id": user_id, "since_id": since_id, "limit": limit},
+        )
+
+    return min(count or 0, limit)
+
+
+def feed_rank(tweet: Tweet) -> tuple[int, int]:
+    """Sort key of the feed, also used as keyset cursor"""
+    return tweet.like_count, tweet.tweet_id
+
+
+async def _read_ranked_tweets(
+    session: AsyncSession,
+    source: Literal["pushed", "pulled"],
+    user_id: int,
+    limit: int,
+    after: tuple[int, int] | None,
+) -> list[Tweet]:
+    params = {"user_id": user_id, "limit": limit}
+    if after is None:
+        statement = RANKED_TWEETS_STATEMENTS[source]
+    else:
+        statement = RANKED_TWEETS_AFTER_STATEMENTS[source]
+        params.update(after_like_count=after[0], after_tweet_id=after[1])
+
+    tweets = await session.scalars(statement, params)
+    return list(tweets.all())
+
+
+async def _load_likes_preview(
+    session: AsyncSession, tweets: list[Tweet], viewer_id: int
+) -> None:
+    """
+    Sets likes of every tweet to the like of the viewer, if any, and up to
+    FEED_LIKES_PREVIEW_SIZE most recent likes. Full list is read by read_likes.
+    """
+    previews: dict[int, list[Like]] = {tweet.tweet_id: [] for tweet in tweets}
+    if previews:
+        tweet_ids = list(previews)
+        viewer_likes = await session.scalars(
+            VIEWER_LIKES_STATEMENT, {"viewer_id": viewer_id, "tweet_ids": tweet_ids}
+        )
+        preview_likes = await session.scalars(
+            PREVIEW_LIKES_STATEMENT,
+            {
+                "tweet_ids": tweet_ids,
+                "preview_size": app_config.FEED_LIKES_PREVIEW_SIZE,
+            },
+        )
+        for like in chain(viewer_likes.all(), preview_likes.all()):
+            preview = previews[like.tweet_id]
+            if like not in preview:
+                preview.append(like)
+
+    # loaded state, not a change: the preview must never be flushed as orphans
+    for tweet in tweets:
+        set_committed_value(tweet, "likes", previews[tweet.tweet_id])
+
+
+async def read_likes(
+    session: AsyncSession,
+    tweet_id: int,
+    offset=0,
+    limit=100,
+) -> Sequence[Like]:
+    """Reads likes of the tweet from the most recent"""
+    statement = (
+        select(Like)
+        .where(Like.tweet_id == tweet_id)
+        .options(joinedload(Like.user))
+        .order_by(desc(Like.created_at), desc(Like.user_id))
         .limit(limit)
         .offset(offset)
     )
-    await session.commit()
-    return tweets.unique().all()
 
+    async with session.begin():
+        likes = await session.scalars(statement)
+    return likes.all()
+
+
+TWEETS_STATEMENT = (
+    select(Tweet)
+    .options(
+        selectinload(Tweet.likes).joinedload(Like.user),
+        joinedload(Tweet.author),
+        selectinload(Tweet.attachments),
+    )
+    .order_by(desc(Tweet.tweet_id))
+    .limit(bindparam("limit", type_=Integer))
+)
+TWEETS_OFFSET_STATEMENT = TWEETS_STATEMENT.offset(bindparam("offset", type_=Integer))
+TWEETS_AFTER_STATEMENT = TWEETS_STATEMENT.where(Tweet.tweet_id < bindparam("after"))
 
+
+@routing.replica_read
 async def read_tweets(
     session: AsyncSession,
     offset=0,
     limit=100,
+    after: int | None = None,
 ) -> Sequence[Tweet]:
-    tweets = await session.scalars(
-        select(Tweet)
-        .options(
-            selectinload(Tweet.likes).joinedload(Like.user),
-            joinedload(Tweet.author),
-            selectinload(Tweet.attachments),
-        )
-        .limit(limit)
-        .offset(offset)
-    )
-    await session.commit()
+    """
+    Reads tweets from newest to oldest.
+
+    :param after: keyset cursor, id of the last seen tweet.
+    """
+    if after is not None:
+        statement = TWEETS_AFTER_STATEMENT
+        params = {"limit": limit, "after": after}
+    else:
+        statement = TWEETS_OFFSET_STATEMENT
+        params = {"limit": limit, "offset": offset}
 
+    async with session.begin():
+        tweets = await session.scalars(statement, params)
     return tweets.all()
 
 
@@ -107,17 +456,40 @@ async def delete_tweet(session: AsyncSession, tweet_id: int, user_id: int):
     async with session.begin():
         tweet_query_result = await session.scalars(select_query)
         tweet = tweet_query_result.one_or_none()
-        if tweet:
-            await session.delete(tweet)
-            return True
-        else:
+        if tweet is None:
             return False
+        if tweet.fanned_out:
+            reader_ids = await crud_timeline.remove_tweet_from_timelines(
+                session=session, tweet_id=tweet.tweet_id
+            )
+        else:
+            reader_ids = await crud_timeline.read_follower_ids(
+                session=session, author_id=user_id
+            )
+        await session.delete(tweet)
+
+    await feed_cache.invalidate(reader_ids)
+    await routing.pin_to_primary([user_id])
+
+    return True
 
 
 async def add_like(tweet_id: int, user_id: int, session: AsyncSession) -> None:
     async with session.begin():
         new_like = Like(tweet_id=tweet_id, user_id=user_id)
         session.add(new_like)
+        await session.flush()
+        await session.execute(
+            update(Tweet)
+            .where(Tweet.tweet_id == tweet_id)
+            .values(like_count=Tweet.like_count + 1)
+        )
+        reader_ids = await crud_timeline.read_feed_readers(
+            session=session, tweet_id=tweet_id
+        )
+
+    await feed_cache.invalidate(reader_ids)
+    await routing.pin_to_primary([user_id])
 
 
 async def remove_like(
@@ -125,11 +497,74 @@ async def remove_like(
     tweet_id: int,
     user_id: int,
 ) -> None:
-    select_query = select(Like).where(
-        Like.tweet_id == tweet_id, Like.user_id == user_id
-    )
     async with session.begin():
-        like_query_result = await session.scalars(select_query)
-        like = like_query_result.one_or_none()
-        if like:
-            await session.delete(like)
+        result = await session.execute(
+            delete(Like).where(Like.tweet_id == tweet_id, Like.user_id == user_id)
+        )
+        if not cast(CursorResult, result).rowcount:
+            return
+        await session.execute(
+            update(Tweet)
+            .where(Tweet.tweet_id == tweet_id)
+            .values(like_count=Tweet.like_count - 1)
+        )
+        reader_ids = await crud_timeline.read_feed_readers(
+            session=session, tweet_id=tweet_id
+        )
+
+    await feed_cache.invalidate(reader_ids)
+    await routing.pin_to_primary([user_id])
+
+
+async def reconcile_like_counts(session: AsyncSession) -> int:
+    """
+    Fixes drift of denormalized like counters, batch by batch of tweet ids.
+    Skips the pass if another worker is reconciling at the moment.
+
+    :return: number of fixed tweets.
+    """
+    engine = cast(AsyncEngine, session.bind)
+    # session level lock on a dedicated connection outlives the batch transactions
+    async with engine.connect() as lock_connection:
+        is_locked = await lock_connection.scalar(
+            select(func.pg_try_advisory_lock(LIKE_RECONCILE_LOCK_ID))
+        )
+        await lock_connection.commit()
+        if not is_locked:
+            return 0
+        try:
+            return await _reconcile_like_count_batches(session=session)
+        finally:
+            await lock_connection.scalar(
+                select(func.pg_advisory_unlock(LIKE_RECONCILE_LOCK_ID))
+            )
+            await lock_connection.commit()
+
+
+async def _reconcile_like_count_batches(session: AsyncSession) -> int:
+    fixed = 0
+    max_tweet_id = await session.scalar(select(func.max(Tweet.tweet_id)))
+    await session.commit()
+
+    batch_size = app_config.LIKE_RECONCILE_BATCH_SIZE
+    for batch_start in range(0, (max_tweet_id or 0) + 1, batch_size):
+        counts = (
+            select(Tweet.tweet_id, func.count(Like.user_id).label("like_count"))
+            .outerjoin(Like, Like.tweet_id == Tweet.tweet_id)
+            .where(Tweet.tweet_id.between(batch_start, batch_start + batch_size - 1))
+            .group_by(Tweet.tweet_id)
+            .subquery()
+        )
+        async with session.begin():
+            result = await session.execute(
+                update(Tweet)
+                .where(
+                    Tweet.tweet_id == counts.c.tweet_id,
+                    Tweet.like_count != counts.c.like_count,
+                )
+                .values(like_count=counts.c.like_count)
+                .execution_options(synchronize_session=False)
+            )
+        fixed += cast(CursorResult, result).rowcount
+
+    return fixed
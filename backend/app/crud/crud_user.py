@@ -1,68 +1,94 @@
-from typing import Literal, Optional, Sequence, Union
+from typing import Literal, Optional, Sequence, Union, cast
 
-from sqlalchemy import delete
+from sqlalchemy import CursorResult, bindparam, delete, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
-from crud.utils import user_include_relations
+from auth import utils as auth_utils
+from cache import feed_cache, user_cache
+from crud import crud_timeline
+from crud.utils import coalesce_calls, user_statements
+from db import routing
 from db_models.follower_model import Follower
 from db_models.user_model import User
+from feed_stream import events
 from schemas.user_schema import CreateUserModel
 
 
 async def create_user(session: AsyncSession, user_data: CreateUserModel) -> User:
-    user = User(**user_data.dict())
+    user = User(**user_data.dict(exclude={"password"}))
+    user.password = await auth_utils.hash_password(user_data.password)
     async with session.begin():
         session.add(user)
+    await routing.pin_to_primary([user.user_id])
 
     return user
 
 
+async def update_password(
+    session: AsyncSession, user_id: int, hashed_password: str
+) -> None:
+    async with session.begin():
+        await session.execute(
+            update(User).where(User.user_id == user_id).values(password=hashed_password)
+        )
+    # bulk updates bypass the mapper events of the user cache
+    user_cache.invalidate(user_id)
+
+
+# built once, calls only bind parameters, see crud_tweet
+READ_USER_STATEMENTS = user_statements(
+    select(User).where(User.user_id == bindparam("user_id"))
+)
+READ_USER_BY_USERNAME_STATEMENTS = user_statements(
+    select(User).where(User.user_name == bindparam("username"))
+)
+READ_ALL_STATEMENTS = user_statements(select(User))
+
+
+@coalesce_calls
+@routing.replica_read
 async def read_user(
     session: AsyncSession,
     user_id: int,
     include_relations: Literal["all", "followers", "following"] | None = None,
 ) -> Optional[User]:
-    statement = select(User).where(User.user_id == user_id)
-
-    statement = user_include_relations(
-        statement=statement, include_relations=include_relations
-    )
-
     async with session.begin():
-        user = await session.scalars(statement)
+        user = await session.scalars(
+            READ_USER_STATEMENTS[include_relations], {"user_id": user_id}
+        )
     return user.one_or_none()
 
 
+@routing.replica_read
 async def read_user_by_username(
     session: AsyncSession,
     username: str,
     include_relations: Literal["all", "followers", "following"] | None = None,
 ):
-    statement = select(User).where(User.user_name == username)
-
-    statement = user_include_relations(
-        statement=statement, include_relations=include_relations
-    )
-
     async with session.begin():
-        user = await session.scalars(statement)
+        user = await session.scalars(
+            READ_USER_BY_USERNAME_STATEMENTS[include_relations], {"username": username}
+        )
     return user.one_or_none()
 
 
+@routing.replica_read
 async def read_all(
     session: AsyncSession,
     include_relations: Optional[Literal["all", "followers", "following"]] = None,
 ) -> Sequence[User]:
-    statement = select(User)
+    async with session.begin():
+        user = await session.scalars(READ_ALL_STATEMENTS[include_relations])
+    return user.all()
+
 
-    statement = user_include_relations(
-        statement=statement, include_relations=include_relations
-    )
+async def read_following_ids(session: AsyncSession, user_id: int) -> set[int]:
+    statement = select(Follower.user_id).where(Follower.follower_id == user_id)
 
     async with session.begin():
-        user = await session.scalars(statement)
-    return user.all()
+        following_ids = await session.scalars(statement)
+    return set(following_ids)
 
 
 async def follow_user(
@@ -80,6 +106,23 @@ async def follow_user(
         follower_association.follower_id = who_fallow_id
         follower_association.user_id = user_id
         session.add(follower_association)
+        await session.flush()
+        await session.execute(
+            update(User)
+            .where(User.user_id == user_id)
+            .values(follower_count=User.follower_count + 1)
+        )
+        await crud_timeline.backfill_timeline(
+            session=session, user_id=who_fallow_id, author_id=user_id
+        )
+        await events.publish(
+            session=session,
+            event={"type": "follow", "user_id": who_fallow_id, "author_id": user_id},
+        )
+
+    user_cache.invalidate(user_id)
+    await feed_cache.invalidate([who_fallow_id])
+    await routing.pin_to_primary([who_fallow_id, user_id])
 
 
 async def unfollow(
@@ -93,8 +136,30 @@ async def unfollow(
         raise TypeError
 
     async with session.begin():
-        await session.execute(
+        result = await session.execute(
             delete(Follower)
             .where(Follower.follower_id == who_unfollow_id)
             .where(Follower.user_id == user_id)
         )
+        if not cast(CursorResult, result).rowcount:
+            return
+        await session.execute(
+            update(User)
+            .where(User.user_id == user_id)
+            .values(follower_count=User.follower_count - 1)
+        )
+        await crud_timeline.prune_timeline(
+            session=session, user_id=who_unfollow_id, author_id=user_id
+        )
+        await events.publish(
+            session=session,
+            event={
+                "type": "unfollow",
+                "user_id": who_unfollow_id,
+                "author_id": user_id,
+            },
+        )
+
+    user_cache.invalidate(user_id)
+    await feed_cache.invalidate([who_unfollow_id])
+    await routing.pin_to_primary([who_unfollow_id, user_id])
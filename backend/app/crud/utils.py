@@ -1,13 +1,22 @@
-from typing import Literal
+import functools
+import inspect
+from typing import Any, Awaitable, Callable, Literal
 
 from sqlalchemy import Select
 from sqlalchemy.orm import selectinload
 
+from cache.single_flight import SingleFlight
+from configs import app_config
 from db_models.user_model import User
 
+single_flight = SingleFlight(timeout=app_config.SINGLE_FLIGHT_TIMEOUT)
+
+
+IncludeRelations = Literal["all", "followers", "following"]
+
 
 def user_include_relations(
-    include_relations: Literal["all", "followers", "following"] | None,
+    include_relations: IncludeRelations | None,
     statement: Select,
 ) -> Select:
     if include_relations == "followers":
@@ -25,3 +34,42 @@ def user_include_relations(
         )
 
     return statement
+
+
+def user_statements(statement: Select) -> dict[str | None, Select]:
+    """Builds the statement once for every value of include_relations"""
+    values: tuple[IncludeRelations | None, ...] = (
+        None,
+        "all",
+        "followers",
+        "following",
+    )
+    return {
+        include_relations: user_include_relations(
+            include_relations=include_relations, statement=statement
+        )
+        for include_relations in values
+    }
+
+
+def coalesce_calls(
+    func: Callable[..., Awaitable[Any]]
+) -> Callable[..., Awaitable[Any]]:
+    """
+    Decorator for read functions. Concurrent calls with equal arguments share one
+    database query, session of the first call is used.
+    """
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        arguments = signature.bind(*args, **kwargs)
+        arguments.apply_defaults()
+        key = (func.__qualname__,) + tuple(
+            (name, value)
+            for name, value in arguments.arguments.items()
+            if name != "session"
+        )
+        return await single_flight.do(key, lambda: func(*args, **kwargs))
+
+    return wrapper
@@ -0,0 +1,10 @@
+class NoMediaFoundError(Exception):
+    """Raised with ids of the media which are missing or belong to another user"""
+
+    @property
+    def error_message(self) -> str:
+        if not self.args:
+            return "Media not found"
+        return "Media not found or belongs to another user: ids={}".format(
+            ", ".join(map(str, self.args[0]))
+        )
@@ -1,7 +1,10 @@
 from db.base_class import Base
+from db_models.api_key_model import ApiKey
 from db_models.follower_model import Follower
 from db_models.like_model import Like
+from db_models.media_blob_model import MediaBlob
 from db_models.media_model import Media
+from db_models.timeline_model import TimelineEntry
 from db_models.tweet_media_relation import tweet_media_relationship
 from db_models.tweet_model import Tweet
 from db_models.user_model import User
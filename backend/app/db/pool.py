@@ -0,0 +1,92 @@
+"""
+Connection pool of the engines, configured in app_config and instrumented
+with the metrics of the acquisition.
+"""
+from time import perf_counter
+from typing import Any, cast
+
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, PoolProxiedConnection
+
+import metrics
+from configs import app_config
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Counts callers waiting for a connection of the exhausted pool, observes
+    acquire latency
+    """
+
+    metric_prefix = "db_pool"
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.waiters = 0
+
+    def connect(self) -> PoolProxiedConnection:
+        # includes the wait for a free connection, opening a new one and
+        # pre-ping, all that delays the query
+        start = perf_counter()
+        waits = self.is_exhausted()
+        if waits:
+            self.waiters += 1
+        try:
+            return super().connect()
+        finally:
+            if waits:
+                self.waiters -= 1
+            metrics.observe(
+                "{}.acquire_seconds".format(self.metric_prefix), perf_counter() - start
+            )
+
+    def is_exhausted(self) -> bool:
+        """All connections are checked out and no overflow one can be opened"""
+        max_overflow = self._max_overflow
+        return max_overflow > -1 and self.checkedout() >= self.size() + max_overflow
+
+
+def pool_class(name: str) -> type[InstrumentedQueuePool]:
+    """Pool class of the engine, the class survives pool recreation"""
+    return type(
+        "InstrumentedQueuePool_{}".format(name),
+        (InstrumentedQueuePool,),
+        {"metric_prefix": "db_pool.{}".format(name)},
+    )
+
+
+def engine_options(name: str) -> dict[str, Any]:
+    """Options of create_async_engine, pool and caches are per worker process"""
+    return {
+        "poolclass": pool_class(name),
+        "pool_size": app_config.DB_POOL_SIZE,
+        "max_overflow": app_config.DB_MAX_OVERFLOW,
+        "pool_recycle": app_config.DB_POOL_RECYCLE,
+        "pool_pre_ping": app_config.DB_POOL_PRE_PING,
+        "pool_timeout": app_config.DB_POOL_TIMEOUT,
+        "query_cache_size": app_config.DB_QUERY_CACHE_SIZE,
+        "connect_args": {
+            "prepared_statement_cache_size": (
+                app_config.DB_PREPARED_STATEMENT_CACHE_SIZE
+            ),
+            "server_settings": {
+                "statement_timeout": str(app_config.DB_STATEMENT_TIMEOUT)
+            },
+        },
+    }
+
+
+def register_pool_gauges(name: str, engine: AsyncEngine) -> None:
+    prefix = "db_pool.{}".format(name)
+    metrics.register_gauge(
+        "{}.checked_out".format(prefix), lambda: _pool(engine).checkedout()
+    )
+    metrics.register_gauge(
+        "{}.overflow".format(prefix), lambda: _pool(engine).overflow()
+    )
+    metrics.register_gauge("{}.waiters".format(prefix), lambda: _pool(engine).waiters)
+
+
+def _pool(engine: AsyncEngine) -> InstrumentedQueuePool:
+    # looked up on every read, the pool may be recreated
+    return cast(InstrumentedQueuePool, engine.pool)
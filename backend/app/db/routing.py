@@ -0,0 +1,68 @@
+"""
+Routing of queries between the primary and the read replica. Read functions
+decorated with replica_read go to the replica, unless the user has written
+recently and could miss own writes because of the replication lag.
+"""
+import functools
+import inspect
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Iterable, Iterator
+
+import metrics
+from cache import replica_pins
+from configs import app_config
+
+_target: ContextVar[str | None] = ContextVar("db_target", default=None)
+
+
+def replica_enabled() -> bool:
+    """Without a replica all queries go to the primary and pins are not needed"""
+    return bool(app_config.DB_REPLICA_HOST)
+
+
+def reads_from_replica() -> bool:
+    return _target.get() == "replica"
+
+
+async def pin_to_primary(user_ids: Iterable[int]) -> None:
+    """Keeps reads of the users on the primary until the replica catches up"""
+    if replica_enabled():
+        await replica_pins.pin(user_ids)
+
+
+@contextmanager
+def use_primary() -> Iterator[None]:
+    """Sends all queries of the block to the primary"""
+    token = _target.set("primary")
+    try:
+        yield
+    finally:
+        _target.reset(token)
+
+
+def replica_read(func: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+    """
+    Decorator for read functions, their queries go to the replica. Function
+    with user_id parameter reads from the primary while the user is pinned.
+    """
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        if _target.get() is not None or not replica_enabled():
+            return await func(*args, **kwargs)
+
+        user_id = signature.bind(*args, **kwargs).arguments.get("user_id")
+        if user_id is not None and await replica_pins.is_pinned(user_id):
+            metrics.increment("db_routing.pinned_reads")
+            return await func(*args, **kwargs)
+
+        metrics.increment("db_routing.replica_reads")
+        token = _target.set("replica")
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            _target.reset(token)
+
+    return wrapper
@@ -3,9 +3,11 @@ from logging import getLogger
 from logging.config import dictConfig
 
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
 
 from configs import app_config
 from configs.logger_config import LOGGER_CONF
+from db import pool, routing
 
 logger = getLogger("main.session")
 dictConfig(LOGGER_CONF)
@@ -14,13 +16,48 @@ TESTING = os.environ.get("TESTING")
 
 logger.debug("TESTING_CONFIG=%s", TESTING)
 
-DB_URL = "postgresql+asyncpg://{user}:{password}@{host}/{db_name}".format(
+DB_URL_TEMPLATE = "postgresql+asyncpg://{user}:{password}@{host}/{db_name}"
+
+DB_URL = DB_URL_TEMPLATE.format(
     user=app_config.DB_USER,
     password=app_config.DB_PASSWORD,
     host=app_config.DB_HOST,
     db_name=app_config.DB_NAME,
 )
 
-async_engine = create_async_engine(DB_URL, pool_size=20, echo=app_config.DEBUG)
-
-async_session = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+async_engine = create_async_engine(
+    DB_URL, echo=app_config.DEBUG, **pool.engine_options("primary")
+)
+pool.register_pool_gauges("primary", async_engine)
+
+replica_engine = None
+if app_config.DB_REPLICA_HOST:
+    replica_engine = create_async_engine(
+        DB_URL_TEMPLATE.format(
+            user=app_config.DB_USER,
+            password=app_config.DB_PASSWORD,
+            host=app_config.DB_REPLICA_HOST,
+            db_name=app_config.DB_NAME,
+        ),
+        echo=app_config.DEBUG,
+        **pool.engine_options("replica"),
+    )
+    pool.register_pool_gauges("replica", replica_engine)
+
+
+class RoutingSession(Session):
+    """Session which sends queries of replica reads to the replica engine"""
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if (
+            replica_engine is not None
+            and routing.reads_from_replica()
+            and not self._flushing
+        ):
+            return replica_engine.sync_engine
+        return super().get_bind(mapper, clause=clause, **kwargs)
+
+
+async_session = async_sessionmaker(
+    bind=async_engine, expire_on_commit=False, sync_session_class=RoutingSession
+)
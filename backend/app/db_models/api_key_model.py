@@ -0,0 +1,33 @@
+from datetime import datetime
+
+from sqlalchemy import DateTime, ForeignKey, Identity, Index, Integer, String, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from db.base_class import Base
+
+
+class ApiKey(Base):
+    """Only sha256 of the key is stored, the key is shown once on creation"""
+
+    __tablename__ = "table_api_keys"
+
+    api_key_id = mapped_column(Integer, Identity(always=True), primary_key=True)
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("table_users.user_id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    name: Mapped[str | None] = mapped_column(String)
+    # first characters of the hex digest, indexed for the lookup
+    hash_prefix: Mapped[str] = mapped_column(String(16), nullable=False)
+    key_hash: Mapped[str] = mapped_column(String(64), nullable=False)
+    created_at = mapped_column(
+        DateTime, nullable=False, default=datetime.now, server_default=func.now()
+    )
+    # written back in batches, see tasks.api_keys
+    last_used_at = mapped_column(DateTime)
+    revoked_at = mapped_column(DateTime)
+
+    __table_args__ = (
+        Index("ix_table_api_keys_hash_prefix", "hash_prefix"),
+        Index("ix_table_api_keys_user_id", "user_id"),
+    )
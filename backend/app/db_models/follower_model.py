@@ -1,4 +1,4 @@
-from sqlalchemy import ForeignKey
+from sqlalchemy import ForeignKey, Index
 from sqlalchemy.orm import Mapped, mapped_column
 
 from db.base_class import Base
@@ -15,3 +15,8 @@ class Follower(Base):
         ForeignKey("table_users.user_id"),
         primary_key=True,
     )
+
+    __table_args__ = (
+        # authors followed by the user, the primary key starts with user_id
+        Index("ix_table_followers_follower_id_user_id", "follower_id", "user_id"),
+    )
@@ -1,4 +1,6 @@
-from sqlalchemy import ForeignKey
+from datetime import datetime
+
+from sqlalchemy import DateTime, ForeignKey, Index, func, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from db.base_class import Base
@@ -15,5 +17,18 @@ class Like(Base):
         ForeignKey("table_users.user_id"),
         primary_key=True,
     )
+    created_at = mapped_column(
+        DateTime, nullable=False, default=datetime.now, server_default=func.now()
+    )
 
     user: Mapped["User"] = relationship(lazy="raise")
+
+    __table_args__ = (
+        Index(
+            "ix_table_likes_tweet_id_created_at",
+            "tweet_id",
+            text("created_at DESC"),
+        ),
+        # likes of the viewer, deletion of users
+        Index("ix_table_likes_user_id_tweet_id", "user_id", "tweet_id"),
+    )
@@ -0,0 +1,26 @@
+from sqlalchemy import Integer, String, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+
+from db.base_class import Base
+
+
+class MediaBlob(Base):
+    """
+    Content addressed file shared by all the media rows with the same content
+    """
+
+    __tablename__ = "table_media_blobs"
+
+    # sha256 hex digest of the file content
+    hash: Mapped[str] = mapped_column(String(64), primary_key=True)
+    link: Mapped[str] = mapped_column(String, nullable=False)
+    size: Mapped[int] = mapped_column(Integer, nullable=False)
+    # number of media rows referencing the blob, the file is removed at zero
+    ref_count: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    # links of the resized variants by name, filled in the background
+    variants: Mapped[dict[str, str]] = mapped_column(
+        JSONB, nullable=False, default=dict, server_default=text("'{}'::jsonb")
+    )
@@ -1,29 +1,83 @@
-import os
+from datetime import datetime
 from logging import getLogger
 
-from sqlalchemy import Column, Identity, Integer, String, event
+from sqlalchemy import (
+    Column,
+    DateTime,
+    ForeignKey,
+    Identity,
+    Integer,
+    String,
+    delete,
+    event,
+    func,
+    text,
+    update,
+)
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Session, object_session
 
-from configs.app_config import DEBUG, MEDIA_ROOT
 from db.base_class import Base
+from db_models.media_blob_model import MediaBlob
+from storage import media_storage
 
 logger = getLogger("main.media_model")
 
+# session.info key of the links of the files to remove after commit
+DELETED_FILES_KEY = "deleted_media_files"
+
 
 class Media(Base):
     __tablename__ = "table_media"
 
     media_id = Column(Integer, Identity(always=True), primary_key=True)
     link = Column(String, nullable=False)
+    # NULL for the media uploaded before content addressed storage
+    owner_id = Column(Integer, ForeignKey("table_users.user_id"))
+    blob_hash = Column(String(64), ForeignKey("table_media_blobs.hash"))
+    # copy of the blob variants, see crud_media.set_variants
+    variants = Column(
+        JSONB, nullable=False, default=dict, server_default=text("'{}'::jsonb")
+    )
+    created_at = Column(
+        DateTime, nullable=False, default=datetime.now, server_default=func.now()
+    )
 
 
 @event.listens_for(Media, "after_delete")
-def after_delete_media(_, __, target):
-    file_path = os.path.join(MEDIA_ROOT.as_posix(), target.link)
-    try:
-        os.remove(file_path)
-        logger.debug("File '%s' deleted.", file_path)
-    except FileNotFoundError as exc:
-        if DEBUG:
-            raise FileNotFoundError(exc)
-        else:
-            logger.error("File '%s' not found.", file_path)
+def after_delete_media(_, connection, target):
+    """
+    Releases the blob of the media. Files are not removed inside the flush,
+    they are collected and removed after commit, see remove_deleted_files.
+    """
+    links = [target.link]
+    if target.blob_hash is not None:
+        ref_count = connection.execute(
+            update(MediaBlob)
+            .where(MediaBlob.hash == target.blob_hash)
+            .values(ref_count=MediaBlob.ref_count - 1)
+            .returning(MediaBlob.ref_count)
+        ).scalar_one()
+        if ref_count > 0:
+            return
+        variants = connection.execute(
+            delete(MediaBlob)
+            .where(MediaBlob.hash == target.blob_hash)
+            .returning(MediaBlob.variants)
+        ).scalar_one()
+        links.extend(variants.values())
+
+    session = object_session(target)
+    session.info.setdefault(DELETED_FILES_KEY, []).extend(links)
+
+
+@event.listens_for(Session, "after_commit")
+def remove_deleted_files(session):
+    links = session.info.pop(DELETED_FILES_KEY, None)
+    if links:
+        media_storage.delete_later(links)
+
+
+@event.listens_for(Session, "after_rollback")
+def forget_deleted_files(session):
+    session.info.pop(DELETED_FILES_KEY, None)
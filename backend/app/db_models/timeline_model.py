@@ -0,0 +1,28 @@
+from sqlalchemy import ForeignKey, Index
+from sqlalchemy.orm import Mapped, mapped_column
+
+from db.base_class import Base
+
+
+class TimelineEntry(Base):
+    """Materialized home timeline: one row per tweet delivered to a follower"""
+
+    __tablename__ = "table_timelines"
+
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("table_users.user_id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    tweet_id: Mapped[int] = mapped_column(
+        ForeignKey("table_tweets.tweet_id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    author_id: Mapped[int] = mapped_column(
+        ForeignKey("table_users.user_id", ondelete="CASCADE"),
+        nullable=False,
+    )
+
+    __table_args__ = (
+        Index("ix_table_timelines_user_id_author_id", "user_id", "author_id"),
+        Index("ix_table_timelines_tweet_id", "tweet_id"),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import ForeignKey, Table, Column
+from sqlalchemy import ForeignKey, Index, Table, Column
 
 from db.base_class import Base
 
@@ -15,4 +15,6 @@ tweet_media_relationship = Table(
         ForeignKey("table_media.media_id", ondelete="CASCADE"),
         primary_key=True,
     ),
+    # lookup of the tweets of the media, see crud_media.delete_orphaned_media
+    Index("ix_table_media_tweet_relation_media_id", "media_id"),
 )
@@ -1,7 +1,16 @@
 from datetime import datetime
 from typing import List
 
-from sqlalchemy import DateTime, ForeignKey, Identity, Integer, String
+from sqlalchemy import (
+    Boolean,
+    DateTime,
+    ForeignKey,
+    Identity,
+    Index,
+    Integer,
+    String,
+    text,
+)
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from db.base_class import Base
@@ -21,6 +30,15 @@ class Tweet(Base):
     )
     content = mapped_column(String, nullable=False)
     created_at = mapped_column(DateTime, default=datetime.now)
+    # False when the author had too many followers and the tweet was not pushed
+    # to the home timelines. Such tweets are pulled by the feed at read time.
+    fanned_out: Mapped[bool] = mapped_column(
+        Boolean, nullable=False, default=True, server_default=text("true")
+    )
+    # denormalized count of likes, see crud_tweet.reconcile_like_counts
+    like_count: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
 
     likes: Mapped[List["Like"]] = relationship(
         lazy="raise", cascade="all, delete-orphan"
@@ -35,6 +53,21 @@ class Tweet(Base):
         single_parent=True,
     )
 
+    __table_args__ = (
+        Index("ix_table_tweets_author_id_tweet_id", "author_id", "tweet_id"),
+        Index(
+            "ix_table_tweets_pulled_author_id_tweet_id",
+            "author_id",
+            "tweet_id",
+            postgresql_where=text("NOT fanned_out"),
+        ),
+        Index(
+            "ix_table_tweets_like_count_tweet_id",
+            text("like_count DESC"),
+            text("tweet_id DESC"),
+        ),
+    )
+
     def __repr__(self) -> str:
         return "Tweet(id={},author={}, text={}, created={}, likes={})".format(
             self.tweet_id, self.author_id, self.content, self.created_at, self.likes
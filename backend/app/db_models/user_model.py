@@ -17,6 +17,9 @@ class User(Base):
     first_name = mapped_column(String(50), nullable=True)
     last_name = mapped_column(String(50), nullable=True)
     reg_date = mapped_column(Date, default=datetime.today)
+    follower_count: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
 
     followers: Mapped[List["User"]] = relationship(
         "User",
@@ -0,0 +1,108 @@
+import asyncio
+from logging import getLogger
+from typing import Any
+
+import metrics
+from configs import app_config
+
+logger = getLogger("main.feed_stream")
+
+# put to the queue of a subscriber who does not keep up with the events
+RESYNC = {"type": "resync"}
+
+
+class TooManyStreamsError(Exception):
+    """Raised by subscribe when the broker has max_connections subscribers"""
+
+
+class Subscription:
+    def __init__(self, user_id: int, author_ids: set[int], queue_size: int) -> None:
+        self.user_id = user_id
+        self.author_ids = author_ids
+        self.queue: asyncio.Queue[dict[str, Any]] = asyncio.Queue(maxsize=queue_size)
+
+    def put(self, event: dict[str, Any]) -> None:
+        """
+        Puts event to the queue. When the queue is full drops all queued events
+        and asks the client to resync.
+        """
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+            metrics.increment("feed_stream.overflows")
+
+
+class FeedBroker:
+    """In-process pub/sub of the feed events fanned out per connection"""
+
+    def __init__(self, max_connections: int, queue_size: int) -> None:
+        self.max_connections = max_connections
+        self.queue_size = queue_size
+        self._by_author: dict[int, set[Subscription]] = {}
+        self._by_user: dict[int, set[Subscription]] = {}
+        self.connection_count = 0
+
+    def is_full(self) -> bool:
+        return self.connection_count >= self.max_connections
+
+    def subscribe(self, user_id: int, author_ids: set[int]) -> Subscription:
+        """
+        Checks the capacity and registers the subscription at once, without
+        yielding to the event loop in between.
+
+        :raises TooManyStreamsError: when the broker is full.
+        """
+        if self.is_full():
+            raise TooManyStreamsError
+        subscription = Subscription(user_id, author_ids, self.queue_size)
+        self._by_user.setdefault(user_id, set()).add(subscription)
+        for author_id in author_ids:
+            self._by_author.setdefault(author_id, set()).add(subscription)
+        self.connection_count += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._discard(self._by_user, subscription.user_id, subscription)
+        for author_id in subscription.author_ids:
+            self._discard(self._by_author, author_id, subscription)
+        self.connection_count -= 1
+
+    def dispatch(self, event: dict[str, Any]) -> None:
+        """Handles event received from the channel"""
+        event_type = event.get("type")
+        if event_type == "tweet":
+            for subscription in self._by_author.get(event["author_id"], ()):
+                subscription.put(event)
+            metrics.increment("feed_stream.events")
+        elif event_type == "follow":
+            for subscription in self._by_user.get(event["user_id"], ()):
+                subscription.author_ids.add(event["author_id"])
+                self._by_author.setdefault(event["author_id"], set()).add(subscription)
+        elif event_type == "unfollow":
+            for subscription in self._by_user.get(event["user_id"], ()):
+                subscription.author_ids.discard(event["author_id"])
+                self._discard(self._by_author, event["author_id"], subscription)
+        else:
+            logger.error("Unknown feed event: %s", event)
+
+    @staticmethod
+    def _discard(
+        index: dict[int, set[Subscription]], key: int, subscription: Subscription
+    ) -> None:
+        subscriptions = index.get(key)
+        if subscriptions is None:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del index[key]
+
+
+broker = FeedBroker(
+    max_connections=app_config.STREAM_MAX_CONNECTIONS,
+    queue_size=app_config.STREAM_QUEUE_SIZE,
+)
+
+metrics.register_gauge("feed_stream.connections", lambda: broker.connection_count)
@@ -0,0 +1,16 @@
+import json
+from typing import Any
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# payloads of the feed events are published with pg_notify on this channel
+CHANNEL = "feed_events"
+
+
+async def publish(session: AsyncSession, event: dict[str, Any]) -> None:
+    """
+    Publishes event to the listeners of all workers. Notification is
+    transactional, it is delivered only when the session transaction commits.
+    """
+    await session.execute(select(func.pg_notify(CHANNEL, json.dumps(event))))
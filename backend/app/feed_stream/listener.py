@@ -0,0 +1,66 @@
+import asyncio
+import json
+from logging import getLogger
+
+import asyncpg
+
+from db.session import DB_URL
+from feed_stream.broker import broker
+from feed_stream.events import CHANNEL
+
+logger = getLogger("main.feed_stream")
+
+DSN = DB_URL.replace("postgresql+asyncpg://", "postgresql://", 1)
+
+RECONNECT_DELAY = 5  # seconds
+
+_connection: asyncpg.Connection | None = None
+_reconnect_task: asyncio.Task | None = None
+
+
+async def start_listener() -> None:
+    """
+    Listens to the feed events channel on a dedicated connection, so events
+    published by any worker reach subscribers of this worker.
+    """
+    global _connection
+
+    _connection = await asyncpg.connect(DSN)
+    _connection.add_termination_listener(_on_termination)
+    await _connection.add_listener(CHANNEL, _on_notification)
+    logger.debug("Listening to '%s' channel", CHANNEL)
+
+
+async def stop_listener() -> None:
+    global _connection
+
+    if _reconnect_task is not None:
+        _reconnect_task.cancel()
+    if _connection is not None:
+        connection, _connection = _connection, None
+        await connection.close()
+
+
+def _on_notification(_: object, __: int, ___: str, payload: object) -> None:
+    try:
+        broker.dispatch(json.loads(str(payload)))
+    except (ValueError, KeyError) as exc:
+        logger.error("Wrong feed event payload: %s", payload, exc_info=exc)
+
+
+def _on_termination(connection: object) -> None:
+    global _reconnect_task
+
+    if connection is _connection:
+        logger.error("Feed events listener connection lost")
+        _reconnect_task = asyncio.create_task(_reconnect())
+
+
+async def _reconnect() -> None:
+    while True:
+        await asyncio.sleep(RECONNECT_DELAY)
+        try:
+            await start_listener()
+            return
+        except (OSError, asyncpg.PostgresError) as exc:
+            logger.error("Feed events listener reconnect failed", exc_info=exc)
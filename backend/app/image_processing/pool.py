@@ -0,0 +1,105 @@
+import asyncio
+import multiprocessing
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from logging import getLogger
+from typing import Awaitable, Callable
+from uuid import uuid4
+
+from PIL import Image, UnidentifiedImageError
+from sqlalchemy.exc import SQLAlchemyError
+
+import metrics
+from configs import app_config
+from image_processing.variants import make_variants
+from storage import fs, media_storage
+
+logger = getLogger("main.image_processing")
+
+# failures of a single image, the pool keeps processing the others
+VARIANT_ERRORS: tuple[type[Exception], ...] = (
+    OSError,
+    UnidentifiedImageError,
+    Image.DecompressionBombError,
+    BrokenProcessPool,
+    SQLAlchemyError,
+    *media_storage.STORAGE_ERRORS,
+)
+
+_executor: ProcessPoolExecutor | None = None
+_tasks: set[asyncio.Task] = set()
+
+
+def start_pool() -> None:
+    global _executor
+
+    # forked workers would inherit the event loop, sockets and locks of the app
+    _executor = ProcessPoolExecutor(
+        max_workers=app_config.IMAGE_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+    logger.debug("Image processing pool started, workers=%s", app_config.IMAGE_WORKERS)
+
+
+async def shutdown_pool() -> None:
+    global _executor
+
+    if _executor is None:
+        return
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _executor.shutdown(cancel_futures=True)
+    _executor = None
+
+
+def enqueue_variants(
+    link: str, on_ready: Callable[[dict[str, str]], Awaitable[None]]
+) -> None:
+    """
+    Schedules generation of the resized variants of the image, on_ready is
+    awaited with links of the variants. Does nothing when the pool is not
+    started, e.g. in tests.
+    """
+    if _executor is None:
+        logger.debug("Image processing pool is not started, skip '%s'", link)
+        return
+
+    task = asyncio.create_task(_generate_variants(link, on_ready))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    metrics.increment("media.variants_enqueued")
+
+
+async def _generate_variants(
+    link: str, on_ready: Callable[[dict[str, str]], Awaitable[None]]
+) -> None:
+    """
+    Images are processed in a local working directory, the original is fetched
+    from the media storage and the variants are saved to it.
+    """
+    loop = asyncio.get_running_loop()
+    work_dir = app_config.UPLOAD_TMP_DIR / uuid4().hex
+    try:
+        with metrics.timer("media.variants_seconds"):
+            await media_storage.download(link, work_dir / link)
+            variants = await loop.run_in_executor(
+                _executor,
+                make_variants,
+                work_dir.as_posix(),
+                link,
+                app_config.MEDIA_VARIANT_WIDTHS,
+                app_config.MEDIA_VARIANT_FORMAT,
+                app_config.MEDIA_VARIANT_QUALITY,
+            )
+            for variant_link in variants.values():
+                await media_storage.save(work_dir / variant_link, variant_link)
+        if variants:
+            await on_ready(variants)
+    except VARIANT_ERRORS as exc:
+        metrics.increment("media.variants_failed")
+        logger.error("Variants of '%s' were not generated", link, exc_info=exc)
+    finally:
+        await fs.run("rmtree", partial(shutil.rmtree, work_dir, ignore_errors=True))
@@ -0,0 +1,48 @@
+"""
+CPU bound image processing, executed in the worker processes of the pool.
+"""
+import os
+from pathlib import Path
+
+from PIL import Image, UnidentifiedImageError
+
+
+def make_variants(
+    media_root: str,
+    link: str,
+    widths: dict[str, int],
+    image_format: str,
+    quality: int,
+) -> dict[str, str]:
+    """
+    Creates resized copies of the image next to the original.
+    Variants not narrower than the original are skipped.
+
+    :return: links of the created variants by name.
+    """
+    source = Path(media_root) / link
+    variants = {}
+
+    try:
+        with Image.open(source) as image:
+            image.load()
+            for name, width in widths.items():
+                if width >= image.width:
+                    continue
+                variant = image.copy()
+                variant.thumbnail((width, image.height))
+                if variant.mode not in ("RGB", "RGBA"):
+                    variant = variant.convert("RGBA")
+
+                variant_link = "{}_{}.{}".format(
+                    os.path.splitext(link)[0], name, image_format.lower()
+                )
+                target = Path(media_root) / variant_link
+                tmp_target = target.with_name("." + target.name)
+                variant.save(tmp_target, format=image_format, quality=quality)
+                os.replace(tmp_target, target)
+                variants[name] = variant_link
+    except UnidentifiedImageError:
+        return {}
+
+    return variants
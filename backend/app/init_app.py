@@ -9,9 +9,15 @@ from starlette.exceptions import HTTPException
 from api.api_v1 import exception_handlers
 from api.api_v1.routers import api_router
 from auth.endpoints import auth_router
+from configs import app_config
 from custom_exc.db_exception import DbIntegrityError
+from custom_exc.no_media_found import NoMediaFoundError
 from custom_exc.no_user_found import NoUserFoundError
+from feed_stream import listener
+from image_processing import pool
 from logger import init_logger
+from storage import media_storage
+from tasks import api_keys, like_counter, media_gc, periodic, timelines
 
 logger = getLogger("main.init_app")
 
@@ -25,6 +31,25 @@ sentry_sdk.init(
 )
 
 
+async def start_background_tasks() -> None:
+    periodic.schedule(
+        like_counter.reconcile_like_counts, app_config.LIKE_RECONCILE_INTERVAL
+    )
+    periodic.schedule(media_gc.collect_orphaned_media, app_config.MEDIA_GC_INTERVAL)
+    periodic.schedule(api_keys.write_last_used, app_config.API_KEY_LAST_USED_INTERVAL)
+    periodic.schedule(timelines.trim_timelines, app_config.TIMELINE_TRIM_INTERVAL)
+    await listener.start_listener()
+    pool.start_pool()
+
+
+async def stop_background_tasks() -> None:
+    await periodic.cancel_all()
+    await api_keys.write_last_used()
+    await listener.stop_listener()
+    await pool.shutdown_pool()
+    await media_storage.close()
+
+
 def create_app() -> FastAPI:
     init_logger()
 
@@ -42,6 +67,11 @@ def create_app() -> FastAPI:
         handler=exception_handlers.no_user_found_handler,
     )
 
+    app.add_exception_handler(
+        exc_class_or_status_code=NoMediaFoundError,
+        handler=exception_handlers.no_media_found_handler,
+    )
+
     app.add_exception_handler(
         exc_class_or_status_code=HTTPException,
         handler=exception_handlers.http_exceptions_handler,
@@ -57,6 +87,9 @@ def create_app() -> FastAPI:
         handler=exception_handlers.unexpected_error_handler,
     )
 
+    app.add_event_handler("startup", start_background_tasks)
+    app.add_event_handler("shutdown", stop_background_tasks)
+
     logger.info("Application started. Worker pid=%s.", getpid())
 
     return app
@@ -0,0 +1,44 @@
+"""
+In-process metrics of the current worker, exposed by the /api/metrics endpoint.
+"""
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Any, Callable, Iterator
+
+_counters: dict[str, float] = {}
+_gauges: dict[str, Callable[[], float]] = {}
+_summaries: dict[str, dict[str, float]] = {}
+
+
+def increment(name: str, value: float = 1) -> None:
+    _counters[name] = _counters.get(name, 0) + value
+
+
+def register_gauge(name: str, getter: Callable[[], float]) -> None:
+    """Registers callable which returns current value of the gauge"""
+    _gauges[name] = getter
+
+
+def observe(name: str, value: float) -> None:
+    summary = _summaries.setdefault(name, {"count": 0, "sum": 0.0, "max": 0.0})
+    summary["count"] += 1
+    summary["sum"] += value
+    summary["max"] = max(summary["max"], value)
+
+
+@contextmanager
+def timer(name: str) -> Iterator[None]:
+    """Observes execution time of the block in seconds"""
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, perf_counter() - start)
+
+
+def snapshot() -> dict[str, Any]:
+    return {
+        "counters": dict(_counters),
+        "gauges": {name: getter() for name, getter in _gauges.items()},
+        "summaries": {name: dict(summary) for name, summary in _summaries.items()},
+    }
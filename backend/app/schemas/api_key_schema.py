@@ -0,0 +1,31 @@
+from datetime import datetime
+from typing import List
+
+from pydantic import BaseModel, Field
+
+
+class CreateApiKeyModelIn(BaseModel):
+    name: str | None = None
+
+
+class CreateApiKeyModelOut(BaseModel):
+    result: bool
+    api_key_id: int
+    # shown only once, the key is stored hashed
+    api_key: str
+
+
+class ApiKeyModel(BaseModel):
+    id: int = Field(alias="api_key_id")
+    name: str | None
+    created_at: datetime
+    last_used_at: datetime | None
+    revoked_at: datetime | None
+
+    class Config:
+        orm_mode = True
+
+
+class ApiKeysResponseModel(BaseModel):
+    result: bool
+    api_keys: List[ApiKeyModel]
@@ -1,3 +1,5 @@
+from typing import List
+
 from pydantic import BaseModel, Field, validator
 
 from schemas.user_schema import BriefInfoUserModel
@@ -17,3 +19,8 @@ class LikeForTweetModel(LikeBaseModel):
 
     class Config:
         orm_mode = True
+
+
+class LikesResponseModel(BaseModel):
+    result: bool
+    likes: List[LikeForTweetModel]
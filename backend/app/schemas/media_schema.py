@@ -7,6 +7,8 @@ class MediaBasModel(BaseModel):
 
 class AttachmentModel(BaseModel):
     link: str
+    # links of the resized variants by name
+    variants: dict[str, str] = {}
 
 
 class MediaModelOut(BaseModel):
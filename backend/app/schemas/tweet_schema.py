@@ -2,7 +2,9 @@ from typing import List
 
 from pydantic import BaseModel, Field, validator
 
+from configs import app_config
 from schemas import like_schema, media_schema, user_schema
+from storage import media_storage
 
 
 class TweetBaseModel(BaseModel):
@@ -25,12 +27,20 @@ class CreateTweetModelOut(BaseModel):
 class TweetFullInfoModel(TweetBaseModel):
     id: int = Field(alias="tweet_id")
     author: user_schema.BriefInfoUserModel
+    like_count: int = 0
+    # preview of likes, see crud_tweet.read_feed
     likes: List[like_schema.LikeForTweetModel] = []
     attachments: List[media_schema.AttachmentModel] = []
 
     @validator("attachments")
     def extract_link(cls, attachments: List[media_schema.AttachmentModel]) -> list[str]:
-        return [attachment.link for attachment in attachments]
+        """Feed variant when it is ready, otherwise the original"""
+        return [
+            media_storage.url(
+                attachment.variants.get(app_config.MEDIA_FEED_VARIANT, attachment.link)
+            )
+            for attachment in attachments
+        ]
 
     class Config:
         orm_mode = True
@@ -39,3 +49,4 @@ class TweetFullInfoModel(TweetBaseModel):
 class TweetsResponseModel(BaseModel):
     result: bool
     tweets: List[TweetFullInfoModel] | None
+    next_cursor: str | None = None
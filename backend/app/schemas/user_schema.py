@@ -14,6 +14,16 @@ class CreateUserModel(BaseModel):
     password: str
 
 
+class Principal(BaseModel):
+    """Authenticated user, enough for the most of the endpoints"""
+
+    user_id: int
+    user_name: str
+
+    class Config:
+        orm_mode = True
+
+
 class BriefInfoUserModel(UserBaseModel):
     id: int = Field(alias="user_id")
 
@@ -0,0 +1,35 @@
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+
+class MediaStorage(ABC):
+    """
+    Storage of the media files. Files are addressed by link, the path relative
+    to the root of the storage, e.g. images/ab/cd/abcd...ef-1a2b3c4d.png
+    """
+
+    # exceptions of the failed operations, besides the documented return values
+    errors: tuple[type[Exception], ...] = (OSError,)
+
+    @abstractmethod
+    async def save(self, source: Path, link: str) -> None:
+        """Moves local file to the storage, source is removed"""
+
+    @abstractmethod
+    async def download(self, link: str, target: Path) -> None:
+        """Makes local copy of the file"""
+
+    @abstractmethod
+    async def delete(self, link: str) -> None:
+        """Deletes file, missing file is logged"""
+
+    @abstractmethod
+    async def size(self, link: str) -> int | None:
+        """Size of the file in bytes, None when it is missing"""
+
+    @abstractmethod
+    def url(self, link: str) -> str:
+        """URL the clients load the file from"""
+
+    async def close(self) -> None:
+        pass
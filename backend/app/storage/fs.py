@@ -0,0 +1,66 @@
+"""
+Filesystem operations of the media, executed in a bounded thread pool so slow
+storage does not block the event loop.
+"""
+import asyncio
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from logging import getLogger
+from pathlib import Path
+from typing import Any, Callable, TypeVar
+
+import metrics
+from configs import app_config
+
+logger = getLogger("main.storage")
+
+T = TypeVar("T")
+
+_executor = ThreadPoolExecutor(
+    max_workers=app_config.MEDIA_FS_WORKERS, thread_name_prefix="media_fs"
+)
+# directories known to exist, they are never removed by the application
+_existing_dirs: set[Path] = set()
+
+
+async def run(operation: str, func: Callable[..., T], *args: Any) -> T:
+    """Runs func in the pool, observes latency including the wait in the queue"""
+    loop = asyncio.get_running_loop()
+    with metrics.timer("media_fs.{}_seconds".format(operation)):
+        return await loop.run_in_executor(_executor, func, *args)
+
+
+async def makedirs(path: Path) -> None:
+    if path in _existing_dirs:
+        metrics.increment("media_fs.dir_cache_hits")
+        return
+    await run("makedirs", partial(os.makedirs, path, exist_ok=True))
+    _existing_dirs.add(path)
+
+
+async def make_temp_file(directory: Path) -> Path:
+    """Creates empty temporary file in the directory"""
+    await makedirs(directory)
+    return await run("mkstemp", _make_temp_file, directory)
+
+
+async def replace(source: Path, target: Path) -> None:
+    await makedirs(target.parent)
+    await run("replace", os.replace, source, target)
+
+
+async def remove(path: Path, missing_ok: bool = False) -> None:
+    try:
+        await run("remove", os.remove, path)
+        logger.debug("File '%s' deleted.", path)
+    except FileNotFoundError:
+        if not missing_ok:
+            logger.error("File '%s' not found.", path)
+
+
+def _make_temp_file(directory: Path) -> Path:
+    fd, path = tempfile.mkstemp(dir=directory)
+    os.close(fd)
+    return Path(path)
@@ -0,0 +1,42 @@
+import os
+import shutil
+from pathlib import Path
+
+from storage import fs
+from storage.base import MediaStorage
+
+
+class LocalMediaStorage(MediaStorage):
+    """Files under the directory served by nginx, links are relative URLs"""
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+
+    async def save(self, source: Path, link: str) -> None:
+        # uploads are on the same filesystem, rename is atomic so a partially
+        # written file never appears under the root
+        await fs.replace(source, self.root / link)
+
+    async def download(self, link: str, target: Path) -> None:
+        await fs.makedirs(target.parent)
+        await fs.run("link", _link_or_copy, self.root / link, target)
+
+    async def delete(self, link: str) -> None:
+        await fs.remove(self.root / link)
+
+    async def size(self, link: str) -> int | None:
+        try:
+            return await fs.run("getsize", os.path.getsize, self.root / link)
+        except FileNotFoundError:
+            return None
+
+    def url(self, link: str) -> str:
+        return link
+
+
+def _link_or_copy(source: Path, target: Path) -> None:
+    """Hard link is free on the same filesystem, copy otherwise"""
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
@@ -0,0 +1,90 @@
+import asyncio
+from logging import getLogger
+from pathlib import Path
+from typing import Iterable
+
+import metrics
+from configs import app_config
+from storage.base import MediaStorage
+from storage.local import LocalMediaStorage
+
+logger = getLogger("main.storage")
+
+
+def create_media_storage() -> MediaStorage:
+    backend = app_config.MEDIA_STORAGE_BACKEND
+    if backend == "local":
+        return LocalMediaStorage(root=app_config.MEDIA_ROOT)
+    elif backend == "s3":
+        # optional dependency, required by this backend only
+        from storage.s3 import S3MediaStorage
+
+        if app_config.S3_MULTIPART_THRESHOLD >= app_config.MAX_IMG_SIZE:
+            logger.info(
+                "Multipart upload is off: MAX_IMG_SIZE=%s, S3_MULTIPART_THRESHOLD=%s",
+                app_config.MAX_IMG_SIZE,
+                app_config.S3_MULTIPART_THRESHOLD,
+            )
+        return S3MediaStorage(
+            bucket=app_config.S3_BUCKET,
+            public_url=app_config.S3_PUBLIC_URL,
+            endpoint_url=app_config.S3_ENDPOINT_URL,
+            region=app_config.S3_REGION,
+            access_key=app_config.S3_ACCESS_KEY,
+            secret_key=app_config.S3_SECRET_KEY,
+            multipart_threshold=app_config.S3_MULTIPART_THRESHOLD,
+            part_size=app_config.S3_PART_SIZE,
+            max_concurrency=app_config.S3_MAX_CONCURRENCY,
+        )
+    else:
+        raise ValueError("Unknown media storage backend: {}".format(backend))
+
+
+media_storage = create_media_storage()
+# failures of the storage operations, depend on the backend
+STORAGE_ERRORS = media_storage.errors
+
+# deletions scheduled after commit, referenced until done
+_pending: set[asyncio.Task] = set()
+
+metrics.register_gauge("media_storage.pending_deletions", lambda: len(_pending))
+
+
+async def save(source: Path, link: str) -> None:
+    await media_storage.save(source, link)
+
+
+async def download(link: str, target: Path) -> None:
+    await media_storage.download(link, target)
+
+
+async def delete(link: str) -> None:
+    await media_storage.delete(link)
+
+
+async def size(link: str) -> int | None:
+    return await media_storage.size(link)
+
+
+def url(link: str) -> str:
+    return media_storage.url(link)
+
+
+def delete_later(links: Iterable[str]) -> None:
+    """Schedules deletion of the files without waiting for it"""
+    for link in links:
+        task = asyncio.create_task(_delete_logged(link))
+        _pending.add(task)
+        task.add_done_callback(_pending.discard)
+
+
+async def close() -> None:
+    await asyncio.gather(*_pending, return_exceptions=True)
+    await media_storage.close()
+
+
+async def _delete_logged(link: str) -> None:
+    try:
+        await media_storage.delete(link)
+    except STORAGE_ERRORS as exc:
+        logger.error("File '%s' was not deleted", link, exc_info=exc)
@@ -0,0 +1,167 @@
+import asyncio
+import os
+from contextlib import AsyncExitStack
+from logging import getLogger
+from mimetypes import guess_type
+from pathlib import Path
+from typing import Any
+
+import aiofiles
+from aiobotocore.session import get_session
+from botocore.exceptions import BotoCoreError, ClientError
+
+import metrics
+from storage import fs
+from storage.base import MediaStorage
+
+logger = getLogger("main.storage")
+
+
+class S3MediaStorage(MediaStorage):
+    """
+    Files in a bucket of S3 compatible storage, e.g. MinIO. Large files are
+    uploaded in parts, several parts at a time.
+    """
+
+    errors = (OSError, BotoCoreError, ClientError)
+
+    def __init__(
+        self,
+        bucket: str,
+        public_url: str,
+        endpoint_url: str | None,
+        region: str,
+        access_key: str | None,
+        secret_key: str | None,
+        multipart_threshold: int,
+        part_size: int,
+        max_concurrency: int,
+    ) -> None:
+        self.bucket = bucket
+        self.public_url = public_url.rstrip("/")
+        self.endpoint_url = endpoint_url
+        self.region = region
+        self._access_key = access_key
+        self._secret_key = secret_key
+        self.multipart_threshold = multipart_threshold
+        self.part_size = part_size
+        self.max_concurrency = max_concurrency
+        self._exit_stack = AsyncExitStack()
+        self._client: Any = None
+        self._client_lock = asyncio.Lock()
+
+    async def save(self, source: Path, link: str) -> None:
+        client = await self._get_client()
+        size = await fs.run("getsize", os.path.getsize, source)
+        content_type = guess_type(link)[0] or "application/octet-stream"
+
+        with metrics.timer("media_s3.upload_seconds"):
+            if size > self.multipart_threshold:
+                await self._upload_multipart(client, source, link, size, content_type)
+            else:
+                async with aiofiles.open(source, mode="rb") as file:
+                    body = await file.read()
+                await client.put_object(
+                    Bucket=self.bucket, Key=link, Body=body, ContentType=content_type
+                )
+        await fs.remove(source)
+
+    async def download(self, link: str, target: Path) -> None:
+        client = await self._get_client()
+        await fs.makedirs(target.parent)
+
+        response = await client.get_object(Bucket=self.bucket, Key=link)
+        body = response["Body"]
+        # the body proxy enters the raw response, chunks are read from the proxy
+        async with body, aiofiles.open(target, "wb") as file:
+            async for chunk in body.iter_chunks(self.part_size):
+                await file.write(chunk)
+
+    async def delete(self, link: str) -> None:
+        client = await self._get_client()
+        await client.delete_object(Bucket=self.bucket, Key=link)
+        logger.debug("Object '%s' deleted.", link)
+
+    async def size(self, link: str) -> int | None:
+        client = await self._get_client()
+        try:
+            response = await client.head_object(Bucket=self.bucket, Key=link)
+        except ClientError as exc:
+            if exc.response["Error"]["Code"] in ("404", "NoSuchKey"):
+                return None
+            raise
+        return response["ContentLength"]
+
+    def url(self, link: str) -> str:
+        return "{}/{}".format(self.public_url, link)
+
+    async def close(self) -> None:
+        await self._exit_stack.aclose()
+        self._client = None
+
+    async def _get_client(self) -> Any:
+        if self._client is None:
+            async with self._client_lock:
+                if self._client is None:
+                    self._client = await self._exit_stack.enter_async_context(
+                        get_session().create_client(
+                            "s3",
+                            endpoint_url=self.endpoint_url,
+                            region_name=self.region,
+                            aws_access_key_id=self._access_key,
+                            aws_secret_access_key=self._secret_key,
+                        )
+                    )
+        return self._client
+
+    async def _upload_multipart(
+        self, client: Any, source: Path, link: str, size: int, content_type: str
+    ) -> None:
+        upload = await client.create_multipart_upload(
+            Bucket=self.bucket, Key=link, ContentType=content_type
+        )
+        upload_id = upload["UploadId"]
+        # every part is read only when its upload starts, so memory is bounded
+        # by max_concurrency parts
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def upload_part(part_number: int, offset: int) -> dict[str, Any]:
+            async with semaphore:
+                body = await fs.run(
+                    "read_part", _read_part, source, offset, self.part_size
+                )
+                response = await client.upload_part(
+                    Bucket=self.bucket,
+                    Key=link,
+                    UploadId=upload_id,
+                    PartNumber=part_number,
+                    Body=body,
+                )
+                return {"PartNumber": part_number, "ETag": response["ETag"]}
+
+        try:
+            parts = await asyncio.gather(
+                *(
+                    upload_part(part_number, offset)
+                    for part_number, offset in enumerate(
+                        range(0, size, self.part_size), start=1
+                    )
+                )
+            )
+            await client.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=link,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": parts},
+            )
+        except BaseException:
+            await client.abort_multipart_upload(
+                Bucket=self.bucket, Key=link, UploadId=upload_id
+            )
+            raise
+
+
+def _read_part(source: Path, offset: int, size: int) -> bytes:
+    with open(source, "rb") as file:
+        file.seek(offset)
+        return file.read(size)
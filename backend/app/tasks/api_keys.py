@@ -0,0 +1,26 @@
+from logging import getLogger
+
+import metrics
+from cache import api_key_cache
+from crud import crud_api_key
+from db.session import async_session
+
+logger = getLogger("main.api_keys")
+
+
+async def write_last_used() -> None:
+    """Writes back last usage of the api keys collected since the last run"""
+    last_used = api_key_cache.pop_last_used()
+    if not last_used:
+        return
+
+    try:
+        async with async_session() as session:
+            await crud_api_key.update_last_used(session=session, last_used=last_used)
+    except BaseException:
+        # the next run retries
+        api_key_cache.restore_last_used(last_used)
+        raise
+
+    metrics.increment("api_keys.last_used_written", len(last_used))
+    logger.debug("Last usage of %s api keys written", len(last_used))
@@ -0,0 +1,16 @@
+from logging import getLogger
+
+import metrics
+from crud import crud_tweet
+from db.session import async_session
+
+logger = getLogger("main.like_counter")
+
+
+async def reconcile_like_counts() -> None:
+    async with async_session() as session:
+        fixed = await crud_tweet.reconcile_like_counts(session=session)
+
+    metrics.increment("likes.reconciled_tweets", fixed)
+    if fixed:
+        logger.warning("Like counters of %s tweets were out of sync", fixed)
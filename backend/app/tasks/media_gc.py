@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+from logging import getLogger
+
+import metrics
+from configs import app_config
+from crud import crud_media
+from db.session import async_session
+from storage import media_storage
+
+logger = getLogger("main.media_gc")
+
+
+async def collect_orphaned_media() -> None:
+    """Deletes media never attached to a tweet, batch by batch"""
+    created_before = datetime.now() - timedelta(
+        seconds=app_config.MEDIA_GC_GRACE_PERIOD
+    )
+    dry_run = app_config.MEDIA_GC_DRY_RUN
+    after_id = 0
+
+    while True:
+        async with async_session() as session:
+            media_ids, links = await crud_media.delete_orphaned_media(
+                session=session,
+                created_before=created_before,
+                limit=app_config.MEDIA_GC_BATCH_SIZE,
+                after_id=after_id,
+                dry_run=dry_run,
+            )
+        if not media_ids:
+            return
+
+        reclaimed_bytes = await _delete_files(links, dry_run)
+        if dry_run:
+            logger.info(
+                "Dry run: %s orphaned media, %s bytes to reclaim",
+                len(media_ids),
+                reclaimed_bytes,
+            )
+        else:
+            metrics.increment("media_gc.deleted_media", len(media_ids))
+            metrics.increment("media_gc.reclaimed_bytes", reclaimed_bytes)
+            logger.info(
+                "Deleted %s orphaned media, reclaimed %s bytes",
+                len(media_ids),
+                reclaimed_bytes,
+            )
+        after_id = max(media_ids)
+
+
+async def _delete_files(links: list[str], dry_run: bool) -> int:
+    """Returns total size of the files"""
+    total_size = 0
+    for link in links:
+        try:
+            size = await media_storage.size(link)
+            if size is None:
+                logger.error("File '%s' not found.", link)
+                continue
+            if not dry_run:
+                await media_storage.delete(link)
+        except media_storage.STORAGE_ERRORS as exc:
+            logger.error("File '%s' was not deleted", link, exc_info=exc)
+            continue
+        total_size += size
+    return total_size
@@ -0,0 +1,42 @@
+import asyncio
+from logging import getLogger
+from typing import Awaitable, Callable
+
+from sqlalchemy.exc import SQLAlchemyError
+
+logger = getLogger("main.periodic")
+
+_tasks: list[asyncio.Task] = []
+
+
+def schedule(job: Callable[[], Awaitable[None]], interval: float) -> None:
+    """Runs job in the background every interval seconds"""
+    task = asyncio.create_task(_run_periodically(job, interval), name=job.__name__)
+    task.add_done_callback(_log_crash)
+    _tasks.append(task)
+    logger.debug("Periodic task '%s' scheduled, interval=%s", job.__name__, interval)
+
+
+async def cancel_all() -> None:
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
+
+
+async def _run_periodically(job: Callable[[], Awaitable[None]], interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await job()
+        except (SQLAlchemyError, OSError) as exc:
+            # transient database and storage failures, the next run retries
+            logger.error("Periodic task '%s' failed", job.__name__, exc_info=exc)
+
+
+def _log_crash(task: asyncio.Task) -> None:
+    """Reports a periodic task ended by an unexpected error"""
+    if not task.cancelled() and task.exception() is not None:
+        logger.critical(
+            "Periodic task '%s' stopped", task.get_name(), exc_info=task.exception()
+        )
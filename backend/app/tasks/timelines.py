@@ -0,0 +1,26 @@
+from logging import getLogger
+
+import metrics
+from configs import app_config
+from crud import crud_timeline
+from db.session import async_session
+
+logger = getLogger("main.timelines")
+
+
+async def trim_timelines() -> None:
+    """Caps home timelines grown by fan-out and backfill, batch by batch of users"""
+    after_user_id: int | None = 0
+    trimmed_entries = 0
+
+    while after_user_id is not None:
+        async with async_session() as session:
+            after_user_id, deleted = await crud_timeline.trim_timelines(
+                session=session,
+                after_user_id=after_user_id,
+                limit=app_config.TIMELINE_TRIM_BATCH_SIZE,
+            )
+        trimmed_entries += deleted
+
+    metrics.increment("timelines.trimmed_entries", trimmed_entries)
+    logger.debug("Trimmed %s timeline entries", trimmed_entries)
@@ -1,15 +1,28 @@
+import hashlib
+import os
 import random
+from datetime import datetime, timedelta
+from functools import partial
 
 import pytest
+from PIL import Image
+from sqlalchemy import func, select, text, update
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from cache import user_cache
 from configs import app_config
-from crud import crud_media, crud_tweet, crud_user
+from crud import crud_media, crud_timeline, crud_tweet, crud_user
+from custom_exc.no_media_found import NoMediaFoundError
+from db_models.media_blob_model import MediaBlob
+from db_models.media_model import Media
+from db_models.timeline_model import TimelineEntry
 from db_models.tweet_model import Tweet
 from db_models.user_model import User
+from image_processing import pool
 from schemas.tweet_schema import CreateTweetModelIn
-from schemas.user_schema import BriefInfoUserModel, CreateUserModel
+from schemas.user_schema import BriefInfoUserModel, CreateUserModel, Principal
+from storage import media_storage
 
 pytestmark = pytest.mark.asyncio
 
@@ -115,15 +128,40 @@ async def test_unfollow_users(db_session, storage) -> None:
     assert len(user_from_db.following) == 2
 
 
+async def test_user_updates_invalidate_user_cache(db_session, storage) -> None:
+    user_id = storage["main_user_id"]
+    author: BriefInfoUserModel = storage["following"][0]
+    user_cache.write(Principal(user_id=user_id, user_name="test_user"))
+    user_cache.write(Principal(user_id=author.id, user_name=author.name))
+
+    await crud_user.update_password(
+        session=db_session, user_id=user_id, hashed_password="new password"
+    )
+    await crud_user.unfollow(
+        session=db_session, user_who_unfollow=user_id, user_id=author.id
+    )
+    await crud_user.follow_user(
+        session=db_session, user_who_follow=user_id, user_id=author.id
+    )
+    await db_session.close()
+
+    assert user_cache.read(user_id) is None
+    assert user_cache.read(author.id) is None
+
+
 async def test_create_media(db_session, storage) -> None:
     file_name = "test_file.txt"
     storage["file_content"] = "content of file"
-    with open(file_name, "w") as file:
+    os.makedirs(app_config.UPLOAD_TMP_DIR, exist_ok=True)
+    file_path = app_config.UPLOAD_TMP_DIR / file_name
+    with open(file_path, "w") as file:
         file.write(storage["file_content"])
 
     file_data = {
-        "content": open(file_name, "rb").read(),
+        "path": file_path,
         "filename": file_name,
+        "size": len(storage["file_content"]),
+        "sha256": hashlib.sha256(storage["file_content"].encode()).hexdigest(),
     }
 
     media = await crud_media.create_media(
@@ -135,6 +173,45 @@ async def test_create_media(db_session, storage) -> None:
     assert media.media_id is not None
 
 
+async def test_create_duplicate_media(db_session, storage) -> None:
+    file_path = app_config.UPLOAD_TMP_DIR / "duplicate.txt"
+    with open(file_path, "w") as file:
+        file.write(storage["file_content"])
+
+    file_data = {
+        "path": file_path,
+        "filename": "duplicate.txt",
+        "size": len(storage["file_content"]),
+        "sha256": hashlib.sha256(storage["file_content"].encode()).hexdigest(),
+    }
+
+    media = await crud_media.create_media(
+        session=db_session, user_id=storage["main_user_id"], file_data=file_data
+    )
+    original = await db_session.get(Media, storage["media_id"])
+    blob = await db_session.get(MediaBlob, media.blob_hash)
+    await db_session.close()
+    os.remove(file_path)
+    storage["duplicate_media_id"] = media.media_id
+
+    assert media.link == original.link
+    assert blob.ref_count == 2
+
+
+async def test_blob_link_is_unique_per_upload() -> None:
+    blob_hash = hashlib.sha256(b"content of file").hexdigest()
+
+    prefix = "images/{}/{}/{}-".format(blob_hash[:2], blob_hash[2:4], blob_hash)
+
+    first = crud_media.blob_link(blob_hash, "image.PNG")
+    second = crud_media.blob_link(blob_hash, "image.PNG")
+
+    assert first != second
+    for link in (first, second):
+        assert link.startswith(prefix)
+        assert link.endswith(".png")
+
+
 async def test_create_tweet(db_session, storage) -> None:
     tweet_data = CreateTweetModelIn.parse_obj(
         {"tweet_data": "some text", "tweet_media_ids": [storage["media_id"]]}
@@ -146,6 +223,19 @@ async def test_create_tweet(db_session, storage) -> None:
     assert tweet.author_id == storage["main_user_id"]
 
 
+async def test_create_tweet_with_missing_media(db_session, storage) -> None:
+    tweet_data = CreateTweetModelIn.parse_obj(
+        {"tweet_data": "some text", "tweet_media_ids": [storage["media_id"], 10**9]}
+    )
+    with pytest.raises(NoMediaFoundError) as exc_info:
+        await crud_tweet.create_tweet(
+            session=db_session, tweet_data=tweet_data, author=storage["main_user_id"]
+        )
+    await db_session.close()
+
+    assert exc_info.value.args[0] == [10**9]
+
+
 async def test_read_tweet_with_media(db_session, storage) -> None:
     tweet = (
         await crud_tweet.read_tweets(
@@ -162,6 +252,61 @@ async def test_read_tweet_with_media(db_session, storage) -> None:
     assert file_content == storage["file_content"]
 
 
+async def test_delete_orphaned_media(db_session, storage) -> None:
+    created_before = datetime.now() + timedelta(minutes=1)
+    dry_run_ids, _ = await crud_media.delete_orphaned_media(
+        session=db_session, created_before=created_before, limit=10, dry_run=True
+    )
+    media_ids, links = await crud_media.delete_orphaned_media(
+        session=db_session, created_before=created_before, limit=10
+    )
+    original = await db_session.get(Media, storage["media_id"])
+    blob = await db_session.get(MediaBlob, original.blob_hash)
+    await db_session.close()
+
+    assert dry_run_ids == media_ids == [storage["duplicate_media_id"]]
+    assert links == []
+    assert blob.ref_count == 1
+
+
+async def test_generate_variants_of_uploaded_image(
+    db_session, storage, monkeypatch
+) -> None:
+    monkeypatch.setattr(app_config, "IMAGE_WORKERS", 1)
+    file_path = app_config.UPLOAD_TMP_DIR / "image.png"
+    Image.new("RGB", (800, 400), color="red").save(file_path)
+    file_data = {
+        "path": file_path,
+        "filename": "image.png",
+        "size": file_path.stat().st_size,
+        "sha256": hashlib.sha256(file_path.read_bytes()).hexdigest(),
+    }
+    media = await crud_media.create_media(
+        session=db_session, user_id=storage["main_user_id"], file_data=file_data
+    )
+
+    pool.start_pool()
+    try:
+        await pool._generate_variants(
+            str(media.link),
+            partial(crud_media.set_variants, db_session, media.blob_hash),
+        )
+    finally:
+        await pool.shutdown_pool()
+
+    async with db_session.begin():
+        blob = await db_session.get(MediaBlob, media.blob_hash)
+        await db_session.refresh(media)
+    await db_session.close()
+    variant_sizes = [await media_storage.size(link) for link in media.variants.values()]
+    for link in [media.link, *media.variants.values()]:
+        await media_storage.delete(link)
+
+    assert blob.variants == media.variants
+    assert list(media.variants) == ["thumbnail"]
+    assert all(variant_sizes)
+
+
 async def test_add_like(db_session: AsyncSession, storage) -> None:
     tweet: Tweet = (await crud_tweet.read_tweets(session=db_session))[0]
     likes_count_before = len(tweet.likes)
@@ -204,6 +349,15 @@ async def test_remove_like(db_session, storage) -> None:
     assert likes_count_after == likes_count_before - 1
 
 
+async def test_read_releases_connection(db_session, storage) -> None:
+    await crud_tweet.read_feed(session=db_session, user_id=storage["main_user_id"])
+    await crud_tweet.read_likes(session=db_session, tweet_id=1)
+    in_transaction = db_session.in_transaction()
+    await db_session.close()
+
+    assert not in_transaction
+
+
 async def test_delete_tweet(db_session, storage) -> None:
     tweets = await crud_tweet.read_tweets(session=db_session)
     tweets_count_before = len(tweets)
@@ -285,3 +439,159 @@ async def test_delete_tweet_that_does_not_belong_to_user(
     )
     await db_session.close()
     assert not result
+
+
+async def test_unfollow_prunes_timeline(db_session: AsyncSession, storage) -> None:
+    author: BriefInfoUserModel = storage["following"][0]
+    await crud_user.unfollow(
+        session=db_session,
+        user_who_unfollow=storage["main_user_id"],
+        user_id=author.id,
+    )
+
+    feed = await crud_tweet.read_feed(
+        session=db_session, user_id=storage["main_user_id"]
+    )
+    await db_session.close()
+
+    assert feed
+    assert author.id not in [tweet.author_id for tweet in feed]
+
+
+async def test_follow_backfills_timeline(db_session: AsyncSession, storage) -> None:
+    author: BriefInfoUserModel = storage["following"][0]
+    await crud_user.follow_user(
+        session=db_session, user_who_follow=storage["main_user_id"], user_id=author.id
+    )
+
+    feed = await crud_tweet.read_feed(
+        session=db_session, user_id=storage["main_user_id"]
+    )
+    await db_session.close()
+
+    assert len(feed) == len(storage["tweets_for_feed"])
+    assert author.id in [tweet.author_id for tweet in feed]
+
+
+async def test_pulled_tweet_in_feed(
+    db_session: AsyncSession, storage, monkeypatch
+) -> None:
+    monkeypatch.setattr(app_config, "FEED_PULL_FOLLOWERS_THRESHOLD", 0)
+    author: BriefInfoUserModel = storage["following"][0]
+    tweet_data = CreateTweetModelIn.parse_obj({"tweet_data": "tweet for pull"})
+    tweet = await crud_tweet.create_tweet(
+        session=db_session, tweet_data=tweet_data, author=author.id
+    )
+    storage["tweets_for_feed"].append(tweet.tweet_id)
+
+    feed = await crud_tweet.read_feed(
+        session=db_session, user_id=storage["main_user_id"]
+    )
+    await db_session.close()
+
+    assert not tweet.fanned_out
+    assert len(feed) == len(storage["tweets_for_feed"])
+    assert tweet.tweet_id in [tweet.tweet_id for tweet in feed]
+
+
+async def test_feed_query_uses_indexes(db_session: AsyncSession, storage) -> None:
+    statement = crud_tweet.RANKED_TWEETS_STATEMENTS["pulled"].params(
+        user_id=storage["main_user_id"], limit=100
+    )
+    sql = statement.compile(
+        dialect=db_session.bind.dialect, compile_kwargs={"literal_binds": True}
+    )
+    async with db_session.begin():
+        # tables of the tests are tiny, sequential scans would win otherwise
+        await db_session.execute(text("SET LOCAL enable_seqscan = off"))
+        plan = "\n".join(
+            (await db_session.scalars(text("EXPLAIN {}".format(sql)))).all()
+        )
+    await db_session.close()
+
+    assert "ix_table_followers_follower_id_user_id" in plan
+    # latest pulled tweets are read per followed author, up to a limit
+    assert "ix_table_tweets_pulled_author_id_tweet_id" in plan
+    assert plan.count("Limit") == 2
+    assert "Seq Scan" not in plan
+
+
+async def test_like_count_matches_likes(db_session: AsyncSession) -> None:
+    tweets = await crud_tweet.read_tweets(session=db_session)
+    await db_session.close()
+
+    for tweet in tweets:
+        assert tweet.like_count == len(tweet.likes)
+
+
+async def test_reconcile_like_counts(db_session: AsyncSession, storage) -> None:
+    tweet_id = storage["tweets_for_feed"][0]
+    async with db_session.begin():
+        await db_session.execute(
+            update(Tweet).where(Tweet.tweet_id == tweet_id).values(like_count=100)
+        )
+
+    fixed = await crud_tweet.reconcile_like_counts(session=db_session)
+    tweet = await db_session.get(Tweet, tweet_id, populate_existing=True)
+    await db_session.close()
+
+    assert fixed == 1
+    assert tweet is not None
+    assert tweet.like_count < 100
+
+
+async def test_reconcile_like_counts_skips_locked_pass(
+    db_session: AsyncSession, engine, storage
+) -> None:
+    tweet_id = storage["tweets_for_feed"][0]
+    async with db_session.begin():
+        await db_session.execute(
+            update(Tweet).where(Tweet.tweet_id == tweet_id).values(like_count=100)
+        )
+
+    async with engine.connect() as other_worker:
+        await other_worker.scalar(
+            select(func.pg_advisory_lock(crud_tweet.LIKE_RECONCILE_LOCK_ID))
+        )
+        skipped = await crud_tweet.reconcile_like_counts(session=db_session)
+        await other_worker.scalar(
+            select(func.pg_advisory_unlock(crud_tweet.LIKE_RECONCILE_LOCK_ID))
+        )
+    fixed = await crud_tweet.reconcile_like_counts(session=db_session)
+    await db_session.close()
+
+    assert skipped == 0
+    assert fixed == 1
+
+
+async def test_timeline_is_trimmed(
+    db_session: AsyncSession, storage, monkeypatch
+) -> None:
+    monkeypatch.setattr(app_config, "TIMELINE_MAX_SIZE", 2)
+    author: BriefInfoUserModel = storage["following"][1]
+    tweet_data = CreateTweetModelIn.parse_obj({"tweet_data": "latest tweet"})
+    tweet = await crud_tweet.create_tweet(
+        session=db_session, tweet_data=tweet_data, author=author.id
+    )
+    # the write path leaves the cap to the background task
+    after_user_id, deleted = await crud_timeline.trim_timelines(
+        session=db_session, after_user_id=0, limit=100
+    )
+    assert after_user_id is not None
+    last_user_id, _ = await crud_timeline.trim_timelines(
+        session=db_session, after_user_id=after_user_id, limit=100
+    )
+
+    async with db_session.begin():
+        timeline = await db_session.scalars(
+            select(TimelineEntry.tweet_id).where(
+                TimelineEntry.user_id == storage["main_user_id"]
+            )
+        )
+        tweet_ids = timeline.all()
+    await db_session.close()
+
+    assert deleted > 0
+    assert last_user_id is None
+    assert len(tweet_ids) == 2
+    assert tweet.tweet_id in tweet_ids
@@ -0,0 +1,20 @@
+import pytest
+
+from auth import utils as auth_utils
+
+
+@pytest.mark.asyncio
+async def test_hash_and_check_password() -> None:
+    hashed_password = await auth_utils.hash_password("123")
+
+    assert hashed_password != "123"
+    assert await auth_utils.check_password("123", hashed_password)
+    assert not await auth_utils.check_password("1234", hashed_password)
+    assert not auth_utils.needs_rehash(hashed_password)
+
+
+@pytest.mark.asyncio
+async def test_check_legacy_plain_password() -> None:
+    assert await auth_utils.check_password("123", "123")
+    assert not await auth_utils.check_password("1234", "123")
+    assert auth_utils.needs_rehash("123")
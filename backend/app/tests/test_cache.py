@@ -0,0 +1,113 @@
+import asyncio
+import time
+
+import pytest
+from sqlalchemy.exc import SQLAlchemyError
+
+from cache import api_key_cache, token_cache, user_cache
+from cache.feed_cache import MemoryFeedCache
+from cache.lru_cache import TTLLRUCache
+from cache.single_flight import SingleFlight
+from crud import crud_api_key
+from db_models.user_model import User
+from schemas.user_schema import Principal
+from tasks import api_keys
+
+
+def test_lru_eviction() -> None:
+    cache = TTLLRUCache(max_size=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_ttl_expiration() -> None:
+    cache = TTLLRUCache(max_size=2, ttl=60)
+    cache.set("a", 1, ttl=0.01)
+    time.sleep(0.02)
+
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_feed_cache_invalidation() -> None:
+    cache = MemoryFeedCache(max_size=10, ttl=60)
+    key = await cache.make_key(user_id=1, params="0:100:None")
+    await cache.set(key, {"result": True})
+    other_user_key = await cache.make_key(user_id=2, params="0:100:None")
+    await cache.set(other_user_key, {"result": True})
+
+    await cache.invalidate([1])
+
+    assert await cache.get(await cache.make_key(user_id=1, params="0:100:None")) is None
+    assert await cache.get(await cache.make_key(user_id=2, params="0:100:None"))
+
+
+@pytest.mark.asyncio
+async def test_single_flight_shares_call() -> None:
+    single_flight = SingleFlight(timeout=1)
+    calls = []
+
+    async def read() -> int:
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return len(calls)
+
+    results = await asyncio.gather(*[single_flight.do("key", read) for _ in range(5)])
+
+    assert results == [1] * 5
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_single_flight_timeout() -> None:
+    single_flight = SingleFlight(timeout=0.01)
+    calls = []
+
+    async def read() -> int:
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return len(calls)
+
+    await asyncio.gather(single_flight.do("key", read), single_flight.do("key", read))
+
+    assert len(calls) == 2
+
+
+def test_user_cache_invalidated_on_user_update() -> None:
+    user_cache.write(Principal(user_id=1, user_name="test_user"))
+    assert user_cache.read(1) is not None
+
+    user_cache.invalidate_changed_user(None, None, User(user_id=1))
+
+    assert user_cache.read(1) is None
+
+
+def test_token_cache_until_expiration() -> None:
+    principal = Principal(user_id=1, user_name="test_user")
+    token_cache.write("valid", principal, expires_at=time.time() + 60)
+    token_cache.write("expired", principal, expires_at=time.time() - 1)
+
+    assert token_cache.read("valid") == principal
+    assert token_cache.read("expired") is None
+
+
+@pytest.mark.asyncio
+async def test_last_used_kept_when_write_fails(monkeypatch) -> None:
+    async def fail_update(session, last_used) -> None:
+        raise SQLAlchemyError("database is unavailable")
+
+    monkeypatch.setattr(crud_api_key, "update_last_used", fail_update)
+    api_key_cache.mark_used(1)
+    api_key_cache.mark_used(2)
+
+    with pytest.raises(SQLAlchemyError):
+        await api_keys.write_last_used()
+
+    assert api_key_cache.pop_last_used().keys() == {1, 2}
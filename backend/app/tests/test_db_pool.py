@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import metrics
+from configs import app_config
+from db import pool
+from tests.conftest import DB_URL
+
+
+@pytest.mark.asyncio
+async def test_instrumented_pool() -> None:
+    engine = create_async_engine(DB_URL, **pool.engine_options("test"))
+    pool.register_pool_gauges("test", engine)
+
+    async with engine.connect() as connection:
+        timeout = await connection.scalar(
+            text(
+                "SELECT extract(epoch FROM current_setting('statement_timeout')"
+                "::interval) * 1000"
+            )
+        )
+        gauges = metrics.snapshot()["gauges"]
+        assert gauges["db_pool.test.checked_out"] == 1
+        assert gauges["db_pool.test.waiters"] == 0
+    await engine.dispose()
+
+    assert int(timeout) == app_config.DB_STATEMENT_TIMEOUT
+    assert metrics.snapshot()["gauges"]["db_pool.test.checked_out"] == 0
+    assert metrics.snapshot()["summaries"]["db_pool.test.acquire_seconds"]["count"] >= 1
+
+
+@pytest.mark.asyncio
+async def test_pool_counts_waiters_of_exhausted_pool() -> None:
+    options = pool.engine_options("exhausted") | {"pool_size": 1, "max_overflow": 0}
+    engine = create_async_engine(DB_URL, **options)
+    pool.register_pool_gauges("exhausted", engine)
+
+    async def select_one() -> int:
+        async with engine.connect() as connection:
+            return await connection.scalar(text("SELECT 1"))
+
+    async with engine.connect():
+        waiting = asyncio.create_task(select_one())
+        await asyncio.sleep(0.1)
+        waiters = metrics.snapshot()["gauges"]["db_pool.exhausted.waiters"]
+    result = await waiting
+    await engine.dispose()
+
+    assert waiters == 1
+    assert result == 1
+    assert metrics.snapshot()["gauges"]["db_pool.exhausted.waiters"] == 0
@@ -0,0 +1,88 @@
+import pytest
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from configs import app_config
+from db import routing
+from db.session import RoutingSession
+from db_models.user_model import User
+
+from .conftest import DB_URL
+
+pytestmark = pytest.mark.asyncio
+
+
+@routing.replica_read
+async def read_target(user_id: int | None = None) -> bool:
+    return routing.reads_from_replica()
+
+
+@routing.replica_read
+async def count_users(session: AsyncSession, user_id: int | None = None) -> int:
+    async with session.begin():
+        count = await session.scalar(select(func.count(User.user_id)))
+    return count or 0
+
+
+@pytest.fixture
+def replica_engine(monkeypatch):
+    """Second engine of the test database acting as the replica"""
+    engine = create_async_engine(DB_URL)
+    monkeypatch.setattr(app_config, "DB_REPLICA_HOST", "localhost")
+    monkeypatch.setattr("db.session.replica_engine", engine)
+    return engine
+
+
+async def test_create_all(create_all) -> None:
+    """Creates database and initiates tables"""
+    await create_all.__anext__()
+
+
+async def test_replica_read_routing(replica_engine) -> None:
+    assert not routing.reads_from_replica()
+    assert await read_target()
+    assert await read_target(user_id=1001)
+
+    await routing.pin_to_primary([1001])
+    assert not await read_target(user_id=1001)
+    assert await read_target(user_id=1002)
+
+    with routing.use_primary():
+        assert not await read_target()
+    assert not routing.reads_from_replica()
+
+
+async def test_no_routing_without_replica(monkeypatch) -> None:
+    monkeypatch.setattr(app_config, "DB_REPLICA_HOST", None)
+    await routing.pin_to_primary([1003])
+    monkeypatch.setattr(app_config, "DB_REPLICA_HOST", "localhost")
+
+    assert await read_target(user_id=1003)
+
+
+async def test_routing_session_binds(engine, replica_engine) -> None:
+    replica_statements: list[str] = []
+    event.listen(
+        replica_engine.sync_engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: replica_statements.append(statement),
+    )
+    routing_session = async_sessionmaker(
+        bind=engine, expire_on_commit=False, sync_session_class=RoutingSession
+    )
+
+    async with routing_session() as session:
+        async with session.begin():
+            session.add(User(user_name="routed_user", password="password"))
+    assert not replica_statements
+
+    async with routing_session() as session:
+        assert await count_users(session=session, user_id=2001) == 1
+    assert len(replica_statements) == 1
+
+    await routing.pin_to_primary([2001])
+    async with routing_session() as session:
+        assert await count_users(session=session, user_id=2001) == 1
+    assert len(replica_statements) == 1
+
+    await replica_engine.dispose()
@@ -0,0 +1,48 @@
+import pytest
+
+from feed_stream.broker import RESYNC, FeedBroker, TooManyStreamsError
+
+
+@pytest.mark.asyncio
+async def test_broker_dispatches_to_followers() -> None:
+    broker = FeedBroker(max_connections=2, queue_size=10)
+    subscription = broker.subscribe(user_id=1, author_ids={2})
+    event = {"type": "tweet", "tweet_id": 10, "author_id": 2}
+
+    broker.dispatch(event)
+    broker.dispatch({"type": "tweet", "tweet_id": 11, "author_id": 3})
+
+    assert subscription.queue.get_nowait() == event
+    assert subscription.queue.empty()
+
+
+@pytest.mark.asyncio
+async def test_broker_follow_and_unfollow() -> None:
+    broker = FeedBroker(max_connections=2, queue_size=10)
+    subscription = broker.subscribe(user_id=1, author_ids=set())
+
+    broker.dispatch({"type": "follow", "user_id": 1, "author_id": 3})
+    broker.dispatch({"type": "tweet", "tweet_id": 11, "author_id": 3})
+    broker.dispatch({"type": "unfollow", "user_id": 1, "author_id": 3})
+    broker.dispatch({"type": "tweet", "tweet_id": 12, "author_id": 3})
+
+    assert subscription.queue.get_nowait()["tweet_id"] == 11
+    assert subscription.queue.empty()
+
+
+@pytest.mark.asyncio
+async def test_broker_overflow_and_connection_cap() -> None:
+    broker = FeedBroker(max_connections=1, queue_size=2)
+    subscription = broker.subscribe(user_id=1, author_ids={2})
+    for tweet_id in range(3):
+        broker.dispatch({"type": "tweet", "tweet_id": tweet_id, "author_id": 2})
+
+    assert broker.is_full()
+    with pytest.raises(TooManyStreamsError):
+        broker.subscribe(user_id=3, author_ids={2})
+    assert subscription.queue.get_nowait() is RESYNC
+    assert subscription.queue.empty()
+
+    broker.unsubscribe(subscription)
+
+    assert not broker.is_full()
@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+from PIL import Image
+
+from configs import app_config
+from image_processing import pool
+from image_processing.variants import make_variants
+from schemas.tweet_schema import TweetFullInfoModel
+
+
+def test_make_variants(tmp_path) -> None:
+    Image.new("RGB", (800, 400)).save(tmp_path / "image.png")
+
+    variants = make_variants(
+        media_root=tmp_path.as_posix(),
+        link="image.png",
+        widths={"thumbnail": 200, "feed": 1080},
+        image_format="WEBP",
+        quality=80,
+    )
+
+    assert variants == {"thumbnail": "image_thumbnail.webp"}
+    with Image.open(tmp_path / variants["thumbnail"]) as thumbnail:
+        assert thumbnail.size == (200, 100)
+
+
+def test_make_variants_of_not_image(tmp_path) -> None:
+    (tmp_path / "file.txt").write_text("content of file")
+
+    variants = make_variants(
+        media_root=tmp_path.as_posix(),
+        link="file.txt",
+        widths={"thumbnail": 200},
+        image_format="WEBP",
+        quality=80,
+    )
+
+    assert variants == {}
+
+
+@pytest.mark.asyncio
+async def test_pool_makes_variants_in_spawned_worker(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(app_config, "IMAGE_WORKERS", 1)
+    Image.new("RGB", (800, 400)).save(tmp_path / "image.png")
+
+    pool.start_pool()
+    try:
+        variants = await asyncio.get_running_loop().run_in_executor(
+            pool._executor,
+            make_variants,
+            tmp_path.as_posix(),
+            "image.png",
+            {"thumbnail": 200},
+            "WEBP",
+            80,
+        )
+    finally:
+        await pool.shutdown_pool()
+
+    assert variants == {"thumbnail": "image_thumbnail.webp"}
+
+
+def test_feed_returns_variant_link() -> None:
+    tweet = TweetFullInfoModel.parse_obj(
+        {
+            "content": "some text",
+            "tweet_id": 1,
+            "author": {"user_id": 1, "user_name": "test_user"},
+            "attachments": [
+                {"link": "a.png", "variants": {"feed": "a_feed.webp"}},
+                {"link": "b.png"},
+            ],
+        }
+    )
+
+    assert tweet.attachments == ["a_feed.webp", "b.png"]
@@ -1,15 +1,32 @@
+import os
 from operator import itemgetter
 from random import choice
 
 import pytest
 from httpx import AsyncClient
 
-from .conftest import app
+from api import utils
+from configs import app_config
+from crud import crud_api_key
+
+from .conftest import app, async_session_test
 
 pytestmark = pytest.mark.asyncio
 
 other_users = ["user2", "user3", "user4", "user5"]
 headers = {}
+# plain text api keys by user id
+api_keys: dict[int, str] = {}
+
+
+async def api_key(user_id: int) -> str:
+    """Issues an api key of the user on the first call"""
+    if user_id not in api_keys:
+        async with async_session_test() as session:
+            _, api_keys[user_id] = await crud_api_key.create_api_key(
+                session=session, user_id=user_id
+            )
+    return api_keys[user_id]
 
 
 async def test_create_all(create_all) -> None:
@@ -28,8 +45,26 @@ async def test_create_user(storage) -> None:
         response = await client.post("/api/users/", json=data)
 
     storage["main_user_id"] = response.json()["user_id"]
+    api_keys[storage["main_user_id"]] = response.json()["api_key"]
+
+    assert response.status_code == 201
+
+
+async def test_new_user_authenticates_with_returned_key() -> None:
+    """Checks that the key returned on sign up authenticates the new user"""
+    data = {
+        "user_name": "fresh_user",
+        "password": 123,
+    }
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        response = await client.post("/api/users/", json=data)
+        me_response = await client.get(
+            "/api/users/me", headers={"api-key": response.json()["api_key"]}
+        )
 
     assert response.status_code == 201
+    assert me_response.status_code == 200
+    assert me_response.json()["user"]["id"] == response.json()["user_id"]
 
 
 async def test_cannot_create_user_with_same_username() -> None:
@@ -88,7 +123,7 @@ async def test_create_users_to_follow(storage: dict, user_name) -> None:
 async def test_follow_user(storage: dict, index) -> None:
     users_to_follow = storage["users_to_follow"]
     # authenticate user
-    headers = {"api-key": str(storage["main_user_id"])}
+    headers = {"api-key": await api_key(storage["main_user_id"])}
     async with AsyncClient(app=app, base_url="http://testserver") as client:
         response = await client.post(
             f"/api/users/{users_to_follow[index]['id']}/follow",
@@ -122,7 +157,7 @@ async def test_unfollow_user(storage: dict):
     """Unfollow user2"""
 
     # authenticate user
-    headers = {"api-key": str(storage["main_user_id"])}
+    headers = {"api-key": await api_key(storage["main_user_id"])}
 
     user_2_id = storage["user_2_id"]
     async with AsyncClient(app=app, base_url="http://testserver") as client:
@@ -138,7 +173,7 @@ async def test_read_user_with_followers_without_user2(storage):
 
     user_id = storage["main_user_id"]
 
-    headers = {"api-key": str(storage["main_user_id"])}
+    headers = {"api-key": await api_key(storage["main_user_id"])}
     async with AsyncClient(app=app, base_url="http://testserver") as client:
         response = await client.get(
             f"/api/users/{user_id}",
@@ -160,7 +195,7 @@ async def test_read_user_with_followers_without_user2(storage):
 
 async def test_create_media(storage) -> None:
     """Checks file uploading"""
-    headers = {"api-key": str(storage["main_user_id"])}
+    headers = {"api-key": await api_key(storage["main_user_id"])}
 
     with open("for_tests.txt", "w") as file:
         file.write("content of file")
@@ -185,11 +220,28 @@ async def test_create_media(storage) -> None:
     assert response.json()["result"]
 
 
+async def test_create_too_large_media(storage, monkeypatch, tmp_path) -> None:
+    """Checks upload is rejected and its temporary file removed"""
+    monkeypatch.setattr(app_config, "MAX_IMG_SIZE", 4)
+    monkeypatch.setattr(app_config, "UPLOAD_TMP_DIR", tmp_path)
+    headers = {"api-key": await api_key(storage["main_user_id"])}
+
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        response = await client.post(
+            "/api/medias/",
+            files={"file": ("big.txt", b"content of file")},
+            headers=headers,
+        )
+
+    assert response.status_code == 413
+    assert os.listdir(tmp_path) == []
+
+
 async def test_create_tweet(storage: dict):
     """Creates tweet with attached file"""
     media_ids = storage.get("tweet_media_ids")
     data = {"tweet_data": "some text written some user", "tweet_media_ids": media_ids}
-    headers = {"api-key": str(storage["main_user_id"])}
+    headers = {"api-key": await api_key(storage["main_user_id"])}
     async with AsyncClient(app=app, base_url="http://testserver") as client:
         response = await client.post("/api/tweets", json=data, headers=headers)
 
@@ -205,7 +257,7 @@ async def test_create_tweet(storage: dict):
 async def test_add_like(storage: dict):
     """Likes tweet"""
     tweet_id = storage["tweet_id"]
-    headers["api-key"] = str(storage["main_user_id"])
+    headers["api-key"] = await api_key(storage["main_user_id"])
     async with AsyncClient(app=app, base_url="http://testserver") as client:
         response = await client.post(f"/api/tweets/{tweet_id}/likes", headers=headers)
 
@@ -215,7 +267,7 @@ async def test_add_like(storage: dict):
 
 async def test_like_twice(storage: dict):
     tweet_id = storage["tweet_id"]
-    headers["api-key"] = str(storage["main_user_id"])
+    headers["api-key"] = await api_key(storage["main_user_id"])
     async with AsyncClient(app=app, base_url="http://testserver") as client:
         response = await client.post(f"/api/tweets/{tweet_id}/likes", headers=headers)
     assert response.status_code == 400
@@ -224,7 +276,7 @@ async def test_like_twice(storage: dict):
 
 async def test_delete_like_and_add_again(storage: dict):
     tweet_id = storage["tweet_id"]
-    headers["api-key"] = str(storage["main_user_id"])
+    headers["api-key"] = await api_key(storage["main_user_id"])
     async with AsyncClient(app=app, base_url="http://testserver") as client:
         response = await client.delete(f"/api/tweets/{tweet_id}/likes", headers=headers)
         assert response.status_code == 202
@@ -236,7 +288,7 @@ async def test_delete_like_and_add_again(storage: dict):
 
 
 async def test_delete_tweet(storage: dict):
-    headers["api-key"] = str(storage["main_user_id"])
+    headers["api-key"] = await api_key(storage["main_user_id"])
     tweet_id = storage["tweet_id"]
     async with AsyncClient(app=app, base_url="http://testserver") as client:
         response = await client.delete(f"/api/tweets/{tweet_id}", headers=headers)
@@ -250,8 +302,9 @@ async def test_crete_tweets_by_user3(storage: dict):
         if user["username"] == "user3":
             user_id = user["id"]
             break
+    assert user_id is not None
 
-    headers["api-key"] = str(user_id)
+    headers["api-key"] = await api_key(user_id)
     tweets = []
     async with AsyncClient(app=app, base_url="http://testserver") as client:
         for i in range(2):
@@ -284,8 +337,9 @@ async def test_crete_tweets_by_user4(storage: dict):
         if user["username"] == "user4":
             user_id = user["id"]
             break
+    assert user_id is not None
 
-    headers["api-key"] = str(user_id)
+    headers["api-key"] = await api_key(user_id)
     tweets = []
     async with AsyncClient(app=app, base_url="http://testserver") as client:
         for i in range(2):
@@ -319,7 +373,7 @@ async def test_crete_tweets_by_user4(storage: dict):
 
 async def test_feed(storage: dict):
     """Get feed of main user, checks sorting order and tweet's count"""
-    headers["api-key"] = str(storage["main_user_id"])
+    headers["api-key"] = await api_key(storage["main_user_id"])
 
     # add likes for all other tweets except first
     async with AsyncClient(app=app, base_url="http://testserver") as client:
@@ -349,7 +403,7 @@ async def test_feed(storage: dict):
 
 
 async def test_delete_not_my_tweet(storage: dict):
-    headers["api-key"] = str(storage["main_user_id"])
+    headers["api-key"] = await api_key(storage["main_user_id"])
     tweet = choice(storage["other_tweets"])
     async with AsyncClient(app=app, base_url="http://testserver") as client:
         response = await client.delete(
@@ -364,3 +418,161 @@ async def test_conf():
         response = await client.get(url="/api/configs")
 
     assert response.status_code == 200
+
+
+async def test_feed_cursor_pagination(storage: dict):
+    """Reads feed page by page with cursor and compares with the whole feed"""
+    headers["api-key"] = await api_key(storage["main_user_id"])
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        response = await client.get("/api/tweets", headers=headers)
+        whole_feed = [tweet["id"] for tweet in response.json()["tweets"]]
+
+        paged_feed: list[int] = []
+        params = {"limit": 3}
+        while True:
+            response = await client.get("/api/tweets", params=params, headers=headers)
+            response_data = response.json()
+            assert response.status_code == 200
+            paged_feed.extend(tweet["id"] for tweet in response_data["tweets"])
+            if response_data["next_cursor"] is None:
+                break
+            params["cursor"] = response_data["next_cursor"]
+
+    assert paged_feed == whole_feed
+
+
+async def test_feed_invalid_cursor(storage: dict):
+    headers["api-key"] = await api_key(storage["main_user_id"])
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        response = await client.get(
+            "/api/tweets", params={"cursor": "wrong"}, headers=headers
+        )
+        out_of_range = await client.get(
+            "/api/tweets",
+            params={"cursor": utils.encode_cursor(2**40, 1)},
+            headers=headers,
+        )
+
+    assert response.status_code == 400
+    assert out_of_range.status_code == 400
+
+
+@pytest.mark.parametrize("params", [{"limit": 0}, {"limit": 1, "offset": 0}])
+async def test_feed_invalid_page(storage: dict, params: dict):
+    headers["api-key"] = await api_key(storage["main_user_id"])
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        response = await client.get("/api/tweets", params=params, headers=headers)
+
+    assert response.status_code == 422
+
+
+async def test_tweet_likes(storage: dict):
+    """Compares likes preview and like count of the feed with the likes list"""
+    headers["api-key"] = await api_key(storage["main_user_id"])
+    tweet = max(storage["other_tweets"], key=itemgetter("likes"))
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        response = await client.get(
+            f"/api/tweets/{tweet['tweet_id']}/likes", headers=headers
+        )
+        likes = response.json()["likes"]
+
+        response = await client.get("/api/tweets", headers=headers)
+        tweet_in_feed = next(
+            tweet_in_feed
+            for tweet_in_feed in response.json()["tweets"]
+            if tweet_in_feed["id"] == tweet["tweet_id"]
+        )
+
+    assert response.status_code == 200
+    assert len(likes) == tweet["likes"]
+    assert tweet_in_feed["like_count"] == tweet["likes"]
+    assert storage["main_user_id"] in [
+        like["user_id"] for like in tweet_in_feed["likes"]
+    ]
+
+
+async def test_feed_since_id(storage: dict):
+    """Polls feed for tweets newer than the second oldest one"""
+    headers["api-key"] = await api_key(storage["main_user_id"])
+    tweet_ids = sorted(tweet["tweet_id"] for tweet in storage["other_tweets"])
+    since_id = tweet_ids[1]
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        response = await client.get(
+            "/api/tweets", params={"since_id": since_id}, headers=headers
+        )
+        new_tweet_ids = [tweet["id"] for tweet in response.json()["tweets"]]
+
+        head_response = await client.head(
+            "/api/tweets", params={"since_id": since_id}, headers=headers
+        )
+
+    assert response.status_code == 200
+    assert new_tweet_ids == tweet_ids[:1:-1]
+    assert head_response.status_code == 200
+    assert head_response.headers["X-New-Tweets"] == str(len(new_tweet_ids))
+
+
+async def test_api_key_lifecycle(storage: dict):
+    """Creates api key, authenticates with it and revokes it"""
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        response = await client.post(
+            "/api/users/me/api_keys",
+            json={"name": "test key"},
+            headers={"api-key": await api_key(storage["main_user_id"])},
+        )
+        api_key_id = response.json()["api_key_id"]
+        key_headers = {"api-key": response.json()["api_key"]}
+
+        me_response = await client.get("/api/users/me", headers=key_headers)
+        keys_response = await client.get("/api/users/me/api_keys", headers=key_headers)
+        revoke_response = await client.delete(
+            f"/api/users/me/api_keys/{api_key_id}", headers=key_headers
+        )
+        revoked_response = await client.get("/api/users/me", headers=key_headers)
+
+    assert response.status_code == 201
+    assert me_response.json()["user"]["id"] == storage["main_user_id"]
+    assert "test key" in [key["name"] for key in keys_response.json()["api_keys"]]
+    assert "key_hash" not in keys_response.json()["api_keys"][0]
+    assert revoke_response.status_code == 202
+    assert revoked_response.status_code == 404
+
+
+async def test_user_id_is_not_api_key(storage: dict, monkeypatch):
+    user_id = storage["main_user_id"]
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        response = await client.get("/api/users/me", headers={"api-key": str(user_id)})
+        monkeypatch.setattr(app_config, "LEGACY_API_KEYS", True)
+        legacy_response = await client.get(
+            "/api/users/me", headers={"api-key": str(user_id)}
+        )
+
+    assert response.status_code == 404
+    assert legacy_response.status_code == 404
+
+
+async def test_feed_cache_of_pulled_tweet(storage: dict, monkeypatch):
+    """Likes a pulled tweet and checks the cached feed shows the new like"""
+    monkeypatch.setattr(app_config, "FEED_PULL_FOLLOWERS_THRESHOLD", 0)
+    author_id = storage["users_to_follow"][-1]["id"]
+    headers = {"api-key": await api_key(storage["main_user_id"])}
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        response = await client.post(
+            "/api/tweets",
+            json={"tweet_data": "pulled tweet"},
+            headers={"api-key": await api_key(author_id)},
+        )
+        tweet_id = response.json()["tweet_id"]
+
+        feed_before = await client.get("/api/tweets", headers=headers)
+        await client.post(f"/api/tweets/{tweet_id}/likes", headers=headers)
+        feed_after = await client.get("/api/tweets", headers=headers)
+
+    def like_count(feed_response) -> int | None:
+        for tweet in feed_response.json()["tweets"]:
+            if tweet["id"] == tweet_id:
+                return tweet["like_count"]
+        return None
+
+    assert like_count(feed_before) == 0
+    assert like_count(feed_after) == 1
@@ -0,0 +1,118 @@
+import os
+import socket
+from typing import Iterator
+
+import pytest
+from moto.server import ThreadedMotoServer
+
+import metrics
+from storage import fs
+from storage.local import LocalMediaStorage
+from storage.s3 import S3MediaStorage
+
+MiB = 1024 * 1024
+
+
+@pytest.fixture(scope="module")
+def s3_endpoint() -> Iterator[str]:
+    """Local S3 stand-in"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=port, verbose=False)
+    server.start()
+    yield "http://127.0.0.1:{}".format(port)
+    server.stop()
+
+
+async def _s3_storage(endpoint_url: str, bucket: str) -> S3MediaStorage:
+    storage = S3MediaStorage(
+        bucket=bucket,
+        public_url="http://media.test/{}".format(bucket),
+        endpoint_url=endpoint_url,
+        region="us-east-1",
+        access_key="test",
+        secret_key="test",
+        multipart_threshold=5 * MiB,
+        part_size=5 * MiB,
+        max_concurrency=2,
+    )
+    client = await storage._get_client()
+    await client.create_bucket(Bucket=bucket)
+    return storage
+
+
+@pytest.mark.asyncio
+async def test_fs_replace_creates_dirs_once(tmp_path) -> None:
+    source = await fs.make_temp_file(tmp_path / "tmp")
+    target = tmp_path / "a" / "b" / "file"
+
+    await fs.replace(source, target)
+    hits = metrics.snapshot()["counters"].get("media_fs.dir_cache_hits", 0)
+    await fs.makedirs(target.parent)
+
+    assert target.exists()
+    assert not source.exists()
+    assert metrics.snapshot()["counters"]["media_fs.dir_cache_hits"] == hits + 1
+
+
+@pytest.mark.asyncio
+async def test_local_media_storage(tmp_path) -> None:
+    storage = LocalMediaStorage(root=tmp_path / "media")
+    source = tmp_path / "upload"
+    source.write_text("content of file")
+
+    await storage.save(source, "images/ab/file.txt")
+    await storage.download("images/ab/file.txt", tmp_path / "work" / "file.txt")
+    size = await storage.size("images/ab/file.txt")
+    await storage.delete("images/ab/file.txt")
+
+    assert not source.exists()
+    assert (tmp_path / "work" / "file.txt").read_text() == "content of file"
+    assert size == len("content of file")
+    assert await storage.size("images/ab/file.txt") is None
+    assert storage.url("images/ab/file.txt") == "images/ab/file.txt"
+
+
+@pytest.mark.asyncio
+async def test_s3_media_storage(tmp_path, s3_endpoint) -> None:
+    storage = await _s3_storage(s3_endpoint, "media-small")
+    source = tmp_path / "upload"
+    source.write_text("content of file")
+
+    try:
+        await storage.save(source, "images/ab/file.txt")
+        await storage.download("images/ab/file.txt", tmp_path / "work" / "file.txt")
+        size = await storage.size("images/ab/file.txt")
+        await storage.delete("images/ab/file.txt")
+        size_after_delete = await storage.size("images/ab/file.txt")
+    finally:
+        await storage.close()
+
+    assert not source.exists()
+    assert (tmp_path / "work" / "file.txt").read_text() == "content of file"
+    assert size == len("content of file")
+    assert size_after_delete is None
+    assert storage.url("images/ab/file.txt") == (
+        "http://media.test/media-small/images/ab/file.txt"
+    )
+
+
+@pytest.mark.asyncio
+async def test_s3_media_storage_multipart_upload(tmp_path, s3_endpoint) -> None:
+    storage = await _s3_storage(s3_endpoint, "media-large")
+    content = os.urandom(5 * MiB + 1024)
+    source = tmp_path / "upload"
+    source.write_bytes(content)
+
+    try:
+        await storage.save(source, "images/ab/large.bin")
+        await storage.download("images/ab/large.bin", tmp_path / "large.bin")
+        client = await storage._get_client()
+        head = await client.head_object(Bucket="media-large", Key="images/ab/large.bin")
+    finally:
+        await storage.close()
+
+    assert (tmp_path / "large.bin").read_bytes() == content
+    # ETag of an object uploaded in parts ends with the number of parts
+    assert head["ETag"].strip('"').endswith("-2")